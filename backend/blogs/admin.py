@@ -1,7 +1,14 @@
 from django.contrib import admin
 from django.utils.html import format_html
 
-from blogs.models import Post, Comment, PostMedia, Story, UninterestingPost
+from blogs.models import (
+    Post,
+    Comment,
+    MediaBlob,
+    PostMedia,
+    Story,
+    UninterestingPost,
+)
 
 
 class CommentInline(admin.TabularInline):
@@ -61,8 +68,16 @@ class PostMediaAdmin(admin.ModelAdmin):
     file_tag.short_description = 'File'
 
     list_per_page = 10
-    list_display = ('id', 'post', 'file_tag')
-    list_filter = ('post',)
+    list_display = ('id', 'post', 'file_tag', 'is_ready')
+    list_filter = ('post', 'is_ready')
+
+
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'digest', 'file', 'ref_count')
+    search_fields = ('digest',)
+    readonly_fields = ('digest', 'ref_count')
+    list_per_page = 20
 
 
 @admin.register(Comment)
@@ -26,6 +26,14 @@ class PostSerializer(BasePostSerializer):
         child=serializers.CharField(allow_blank=True),
     )
     file = serializers.CharField(read_only=True)
+    file_webp = serializers.CharField(read_only=True)
+    placeholder = serializers.CharField(read_only=True)
+    width = serializers.IntegerField(read_only=True)
+    height = serializers.IntegerField(read_only=True)
+    is_liked = serializers.BooleanField(read_only=True)
+    is_saved = serializers.BooleanField(read_only=True)
+    is_uninteresting = serializers.BooleanField(read_only=True)
+    follows_owner = serializers.BooleanField(read_only=True)
     files = serializers.ListField(
         child=serializers.FileField(allow_empty_file=False, use_url=False),
         write_only=True,
@@ -33,7 +41,14 @@ class PostSerializer(BasePostSerializer):
 
     class Meta:
         model = Post
-        exclude = ['is_comment', 'likes', 'saved', 'archived']
+        exclude = [
+            'is_comment',
+            'likes',
+            'saved',
+            'archived',
+            'likes_count',
+            'cover',
+        ]
         extra_kwargs = {'description': {'write_only': True}}
 
     @transaction.atomic
@@ -54,11 +69,26 @@ class PostUpdateSerializer(BasePostSerializer):
 
     class Meta:
         model = Post
-        exclude = ['is_comment', 'saved', 'archived']
+        exclude = ['is_comment', 'saved', 'archived', 'likes_count', 'cover']
 
 
 class PostMediaSerializer(serializers.Serializer):
     file = serializers.FileField(allow_empty_file=False, use_url=False)
+    is_ready = serializers.BooleanField(read_only=True)
+    width = serializers.IntegerField(read_only=True)
+    height = serializers.IntegerField(read_only=True)
+    sizes = serializers.JSONField(read_only=True)
+    placeholder = serializers.CharField(read_only=True)
+    renditions = serializers.SerializerMethodField()
+
+    def get_renditions(self, obj):
+        return {
+            name: {
+                fmt: obj.get_rendition_url(name, fmt)
+                for fmt in formats
+            }
+            for name, formats in obj.renditions.items()
+        }
 
 
 class PostDetailSerializer(PostUpdateSerializer):
@@ -67,6 +97,10 @@ class PostDetailSerializer(PostUpdateSerializer):
         read_only=True,
         source='get_files',
     )
+    is_liked = serializers.BooleanField(read_only=True)
+    is_saved = serializers.BooleanField(read_only=True)
+    is_uninteresting = serializers.BooleanField(read_only=True)
+    follows_owner = serializers.BooleanField(read_only=True)
     comments = serializers.SerializerMethodField()
 
     def get_comments(self, obj):
@@ -144,9 +178,12 @@ class StorySerializer(serializers.HyperlinkedModelSerializer):
         read_only=True,
     )
 
+    thumbnail = serializers.CharField(read_only=True, source='thumbnail_url')
+
     class Meta:
         model = Story
-        fields = ['url', 'owner', 'img', 'created_at']
+        fields = ['url', 'owner', 'img', 'thumbnail', 'is_ready', 'created_at']
+        read_only_fields = ['is_ready']
 
 
 class ArchiveStorySerializer(StorySerializer):
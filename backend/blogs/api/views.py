@@ -1,5 +1,4 @@
 from django.db import transaction, IntegrityError, models
-from django.utils.decorators import method_decorator
 from taggit.models import Tag
 from rest_framework import status
 from rest_framework.viewsets import ViewSet, ReadOnlyModelViewSet
@@ -8,23 +7,27 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 
-from common.utils import cache_queryset, create_action, get_blocked_users
+from common.cache import cache_queryset, cache_response
+from common.pagination import KeysetPagination
+from common.utils import create_action, get_blocked_users
 from common.viewsets import (
     CustomModelViewSet,
     NonUpdateViewSet,
     ListModelViewSet,
 )
 from blogs import utils
+from blogs.explore import FilteredExplore, session_seed
 from blogs.filters import PostFilter
 from blogs.models import Comment, Story, UninterestingPost
 from blogs.api import serializers
 from blogs.permissions import IsOwner, PostAuthenticated
-from users.models import Follower
+from blogs.viewer import with_viewer_state
 
 
 class PostViewSet(CustomModelViewSet):
     permission_classes = [PostAuthenticated, IsOwner]
     filter_backends = [DjangoFilterBackend]
+    pagination_class = KeysetPagination
     filterset_class = PostFilter
 
     def get_queryset(self):
@@ -33,13 +36,16 @@ class PostViewSet(CustomModelViewSet):
     def list(self, request, *args, **kwargs):
 
         # * Amount of posts depends on user's authentication status
-        user = request.user
-        if user.is_authenticated:
-            queryset = utils.get_explore_posts(user)
+        user = request.user if request.user.is_authenticated else None
+        if PostFilter.is_filtering(request.query_params):
+            queryset = FilteredExplore(
+                self.filter_queryset(utils.get_explore_posts(user)),
+            )
         else:
-            queryset = self.get_queryset()
+            # shuffled, without filters
+            seed = session_seed(request.session)
+            queryset = utils.get_explore_pool(user, seed)
 
-        queryset = self.filter_queryset(queryset)
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -48,8 +54,14 @@ class PostViewSet(CustomModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            page = with_viewer_state(self.request.user, page)
+        return page
+
     def get_serializer_class(self):
-        if self.action in ['list', 'feed', 'create']:
+        if self.action in ['list', 'feed', 'trending', 'create']:
             return serializers.PostSerializer
         elif self.action in ['update', 'partial_update']:
             return serializers.PostUpdateSerializer
@@ -60,13 +72,11 @@ class PostViewSet(CustomModelViewSet):
 
     def retrieve(self, request, *args, **kwargs):
         post = self.get_object()
+        with_viewer_state(request.user, [post])
         owner_privacy = post.owner.privacy
         excluded = []
         if post.owner != request.user:
-            is_follower = Follower.objects.filter(
-                from_user=request.user,
-                to_user=post.owner,
-            ).exists()
+            is_follower = post.follows_owner
 
             # check if user hid comments
             if owner_privacy.comments == 'followers' and not is_follower:
@@ -84,14 +94,28 @@ class PostViewSet(CustomModelViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @cache_response()
     def feed(self, request):
-        queryset = utils.get_feed_posts(request.user.id)
+        # ?order=ranked for the engagement ranked feed
+        ranked = request.query_params.get('order') == 'ranked'
+        queryset = utils.get_feed_posts(request.user.id, ranked)
+        # only the posts of the requested page are loaded from the timeline
+        page = self.paginate_queryset(queryset)
         serializer = self.get_serializer(
-            instance=queryset,
+            instance=page,
             many=True,
             context={'request': request},
         )
-        return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        # ?tag= for the trending posts of a single tag
+        user = request.user if request.user.is_authenticated else None
+        tag = request.query_params.get('tag')
+        posts = with_viewer_state(request.user, utils.get_trending_posts(user, tag))
+        serializer = self.get_serializer(instance=posts, many=True)
+        return Response({'results': serializer.data})
 
     @action(detail=True, methods=['post'])
     def archive(self, request, pk=None):
@@ -100,6 +124,17 @@ class PostViewSet(CustomModelViewSet):
         post.save()
         return Response({'status': 'Archived'}, status.HTTP_206_PARTIAL_CONTENT)
 
+    @action(detail=True, methods=['get'], url_path='media-status')
+    def media_status(self, request, pk=None):
+        """Poll until uploaded images are processed."""
+        post = self.get_object()
+        files = post.files.all()
+        serializer = serializers.PostMediaSerializer(instance=files, many=True)
+        return Response({
+            'is_ready': all(file.is_ready for file in files),
+            'files': serializer.data,
+        })
+
     @action(detail=True, methods=['post'], url_path='comment')
     def add_comment(self, request, pk=None):
         user = request.user
@@ -255,7 +290,7 @@ class StoryViewSet(NonUpdateViewSet):
     serializer_class = serializers.StorySerializer
     permission_classes = [IsAuthenticated, IsOwner]
 
-    @method_decorator(cache_queryset('stories'))
+    @cache_queryset('stories')
     def get_queryset(self):
         blocked_users = get_blocked_users(self.request.user)
         stories = Story.objects.exclude(
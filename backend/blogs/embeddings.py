@@ -0,0 +1,139 @@
+import logging
+import queue
+import threading
+import time
+import numpy as np
+
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+
+from blogs.similarities import Recognizer
+
+
+logger = logging.getLogger(__name__)
+
+# seconds a caller waits for its embeddings
+EMBED_TIMEOUT = 60
+
+
+@dataclass
+class EmbeddingRequest:
+    images: np.ndarray
+    future: Future = field(default_factory=Future)
+
+
+class EmbeddingBatcher:
+    """
+    Long-lived embedding worker.
+
+    The model is loaded once by a background thread, which collects
+    requests from any number of callers into micro-batches. A batch is
+    sent to the model when it reaches `max_batch_size` images or when
+    the oldest request has waited `max_latency` seconds.
+    """
+
+    def __init__(
+        self,
+        recognizer_class: type[Recognizer] = Recognizer,
+        max_batch_size: int = 32,
+        max_latency: float = 0.05,
+    ):
+        self.recognizer_class = recognizer_class
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.requests = queue.Queue()
+        self.images_count = 0
+        self.batches_count = 0
+        self.busy_time = 0.0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, images: np.ndarray) -> Future:
+        request = EmbeddingRequest(images)
+        self.requests.put(request)
+        return request.future
+
+    def embed(self, images: list[str], timeout: float = EMBED_TIMEOUT) -> np.ndarray:
+        """Decode images in the calling thread and wait for embeddings."""
+        decoded = np.stack([self.recognizer_class.load_image(i) for i in images])
+        return self.submit(decoded).result(timeout)
+
+    def collect_batch(self) -> list[EmbeddingRequest]:
+        batch = [self.requests.get()]
+        size = len(batch[0].images)
+        deadline = time.monotonic() + self.max_latency
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.images)
+        return batch
+
+    def run(self):
+        try:
+            recognizer = self.recognizer_class()
+        except Exception as e:
+            logger.exception('Embedding model failed to load')
+            # fail every request instead of leaving the callers waiting
+            while True:
+                self.requests.get().future.set_exception(e)
+
+        while True:
+            batch = self.collect_batch()
+            start = time.perf_counter()
+            try:
+                images = np.concatenate([request.images for request in batch])
+                embeddings = recognizer.predict(images)
+            except Exception as e:
+                logger.exception('Embedding batch failed')
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            self.record(len(images), time.perf_counter() - start)
+
+            offset = 0
+            for request in batch:
+                size = len(request.images)
+                request.future.set_result(embeddings[offset:offset + size])
+                offset += size
+
+    def record(self, images_count: int, elapsed: float):
+        self.images_count += images_count
+        self.batches_count += 1
+        self.busy_time += elapsed
+        logger.info(
+            'Embedded %d images in %.3fs (%.1f images/sec)',
+            images_count,
+            elapsed,
+            images_count / elapsed if elapsed else 0,
+        )
+
+    @property
+    def stats(self) -> dict:
+        busy_time = self.busy_time
+        return {
+            'images': self.images_count,
+            'batches': self.batches_count,
+            'seconds': round(busy_time, 3),
+            'images_per_second': (
+                round(self.images_count / busy_time, 1) if busy_time else 0
+            ),
+        }
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Return the process-wide batcher, starting it on first use."""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = EmbeddingBatcher()
+    return _batcher
@@ -0,0 +1,240 @@
+import random
+import time
+
+from datetime import datetime
+from common.db import in_order
+from common.pagination import DEFAULT_ORDERING, keyset_filter
+from common.utils import redis_client
+from blogs.models import Post
+from users.vip import get_vip_user_ids
+
+
+# most recent posts that are shuffled into the pool
+POOL_SIZE = 5000
+# seconds between refreshes, see the beat schedule in `copygram.celery`
+POOL_REFRESH = 60 * 15
+# a session keeps paging its pool for a while after a refresh
+POOL_TTL = POOL_REFRESH * 4
+
+# boosted posts, rebuilt when a VIP status starts or ends
+VIP_POOL_SIZE = 100
+
+CURRENT_POOL_KEY = 'explore:pool'
+VIP_POOL_KEY = 'explore:vip'
+
+
+def build_pool() -> str:
+    """
+    Shuffle the most recent posts into a new version of the pool,
+    a sorted set scored by a random number in [0, 1).
+    """
+
+    posts = (
+        Post.objects.
+        filter(archived=False).
+        order_by('-created_at').
+        values_list('id', flat=True)[:POOL_SIZE]
+    )
+    scores = {post_id: random.random() for post_id in posts}
+
+    key = f'{CURRENT_POOL_KEY}:{time.time_ns()}'
+    with redis_client.pipeline(transaction=True) as pipeline:
+        if scores:
+            pipeline.zadd(key, scores)
+            pipeline.expire(key, POOL_TTL)
+        # expires well before the pool, so it never names a missing pool
+        # when the refreshes stop
+        pipeline.set(CURRENT_POOL_KEY, key, ex=POOL_TTL - POOL_REFRESH)
+        pipeline.execute()
+    return key
+
+
+def build_vip_pool():
+    """
+    Newest posts of the VIP users, shown before the shuffled pool.
+    Scored by the negated creation time, so they read newest first.
+    """
+
+    posts = (
+        Post.objects.
+        filter(owner_id__any=get_vip_user_ids(), archived=False).
+        order_by('-created_at').
+        values_list('id', 'created_at')[:VIP_POOL_SIZE]
+    )
+    scores = {post_id: -created_at.timestamp() for post_id, created_at in posts}
+    with redis_client.pipeline(transaction=True) as pipeline:
+        pipeline.delete(VIP_POOL_KEY)
+        if scores:
+            pipeline.zadd(VIP_POOL_KEY, scores)
+        pipeline.execute()
+
+
+def session_seed(session) -> float:
+    """Start of the shuffled order, the same for the whole session."""
+    return session.setdefault('explore_seed', random.random())
+
+
+def current_pool() -> str:
+    return redis_client.get(CURRENT_POOL_KEY) or build_pool()
+
+
+def is_pool(key) -> bool:
+    """Whether a key from a cursor names a pool version."""
+    version = key.removeprefix(f'{CURRENT_POOL_KEY}:') if isinstance(key, str) else ''
+    return version.isdigit()
+
+
+class ExplorePool:
+    """
+    Explore posts in a stable shuffled order.
+
+    The posts of VIP users come first, then every visitor reads the same
+    shuffled pool, starting at a random `seed` kept in their session and
+    wrapping around, so pages never repeat or skip posts. Each page is
+    a score range read of sorted sets, and only the posts of the page
+    are loaded from `queryset`.
+    """
+
+    def __init__(self, queryset, user=None, seed: float | None = None):
+        self.queryset = queryset
+        self.user = user
+        self.seed = random.random() if seed is None else seed
+
+    def get_key(self, pool: str) -> str:
+        """The pool, narrowed to the recommended posts of the user."""
+        if self.user is None:
+            return pool
+        key = f'{pool}:user:{self.user.id}'
+        if not redis_client.exists(key):
+            recommendations = f'user:{self.user.username}:posts_recommendations'
+            with redis_client.pipeline(transaction=True) as pipeline:
+                # sets count as scores of 1, weighted to keep the pool scores
+                pipeline.zinterstore(key, {pool: 1, recommendations: 0})
+                pipeline.expire(key, POOL_REFRESH)
+                pipeline.execute()
+        return key
+
+    def segments(self, key: str, seed: float) -> list[tuple[str, float, float]]:
+        """
+        (key, min, max) score ranges, in reading order: the VIP pool,
+        then the shuffled pool from the seed, wrapped around.
+        """
+        return [
+            (VIP_POOL_KEY, float('-inf'), 0),
+            (key, seed, 1),
+            (key, 0, seed),
+        ]
+
+    def seek(self, position: list | None, limit: int) -> tuple[list[Post], list | None]:
+        """
+        Posts after `position`, [pool, seed, segment, score, id] of the
+        last seen post, and the position of the last returned one.
+        The pool version is kept, so a refresh does not reorder the pages,
+        reading starts over once that version has expired.
+        """
+
+        if position is not None:
+            pool, seed, segment, score, post_id = position
+            if not is_pool(pool):
+                raise ValueError('Invalid cursor')
+            if not redis_client.exists(pool):
+                position = None
+        if position is None:
+            pool, seed, segment, after = current_pool(), self.seed, 0, None
+        else:
+            after = (float(score), str(post_id))
+        segments = self.segments(self.get_key(pool), float(seed))
+
+        entries = []
+        while segment < len(segments) and len(entries) <= limit:
+            key, low, high = segments[segment]
+            count = limit + 1 - len(entries)
+            if after is None:
+                fetched = redis_client.zrangebyscore(
+                    key, low, f'({high}', start=0, num=count, withscores=True,
+                )
+            else:
+                # posts with the same score are ordered by member like redis does
+                score = after[0]
+                ties = redis_client.zcount(key, score, score)
+                fetched = [
+                    (member, member_score)
+                    for member, member_score in redis_client.zrangebyscore(
+                        key, score, f'({high}',
+                        start=0, num=count + ties, withscores=True,
+                    )
+                    if (member_score, member) > after
+                ]
+            entries += [(segment, member, score) for member, score in fetched]
+            segment += 1
+            after = None
+
+        page = entries[:limit]
+        ids = [int(member) for segment, member, _ in page]
+        if any(segment > 0 for segment, _, _ in page):
+            # boosted posts were already shown before the shuffled ones
+            boosted = set(map(int, redis_client.zrange(VIP_POOL_KEY, 0, -1)))
+            ids = [
+                post_id for (segment, _, _), post_id in zip(page, ids)
+                if segment == 0 or post_id not in boosted
+            ]
+        posts = self.hydrate(ids)
+        if len(entries) <= limit:
+            return posts, None
+        segment, member, score = page[-1]
+        return posts, [pool, seed, segment, score, member]
+
+    def hydrate(self, ids: list[int]) -> list[Post]:
+        # archived posts and posts of blocked users are skipped
+        return in_order(self.queryset, ids)
+
+
+class FilteredExplore:
+    """
+    Explore posts matching the filters of `queryset`, newest first.
+
+    Like `ExplorePool`, the posts of the VIP pool come first, then
+    the other posts; each part is a keyset range of `queryset`.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def seek(self, position: list | None, limit: int) -> tuple[list[Post], list | None]:
+        """
+        Posts after `position`, [segment, created_at, id] of the last
+        seen post, and the position of the last returned one.
+        """
+
+        if position is None:
+            segment, after = 0, None
+        else:
+            segment, created_at, post_id = position
+            if segment not in (0, 1) or type(post_id) is not int:
+                raise ValueError('Invalid cursor')
+            after = [datetime.fromisoformat(created_at), post_id]
+        boosted = list(map(int, redis_client.zrange(VIP_POOL_KEY, 0, -1)))
+        segments = [
+            self.queryset.filter(id__any=boosted),
+            self.queryset.exclude(id__any=boosted),
+        ]
+
+        entries = []
+        while segment < len(segments) and len(entries) <= limit:
+            posts = segments[segment]
+            if after is not None:
+                posts = posts.filter(keyset_filter(DEFAULT_ORDERING, after))
+            count = limit + 1 - len(entries)
+            entries += [
+                (segment, post)
+                for post in posts.order_by(*DEFAULT_ORDERING)[:count]
+            ]
+            segment += 1
+            after = None
+
+        page = entries[:limit]
+        posts = [post for _, post in page]
+        if len(entries) <= limit:
+            return posts, None
+        segment, post = page[-1]
+        return posts, [segment, post.created_at, post.id]
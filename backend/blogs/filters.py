@@ -15,6 +15,10 @@ class PostFilter(filters.FilterSet):
             'owner__username': ['icontains'],
         }
 
+    @classmethod
+    def is_filtering(cls, data) -> bool:
+        return any(data.get(name) for name in cls.base_filters)
+
     def filter_description(self, queryset, name, value):
         engine = SearchEngineAI(api_key=settings.GEMINI_API_KEY)        
         qs = engine.get_posts(value)
@@ -0,0 +1,79 @@
+from collections import defaultdict
+from PIL import Image
+
+
+HASH_BITS = 64
+
+
+def dhash(img: Image.Image, size: int = 8) -> int:
+    """
+    Difference hash of an image.
+    Each bit tells whether a pixel is brighter than its right neighbour
+    on a (size + 1) x size grayscale thumbnail.
+    """
+
+    img = img.convert('L').resize((size + 1, size), Image.LANCZOS)
+    pixels = list(img.getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def to_signed(value: int) -> int:
+    """Fit an unsigned 64-bit hash into a bigint column."""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+def hamming_distance(first: int, second: int) -> int:
+    return (to_unsigned(first) ^ to_unsigned(second)).bit_count()
+
+
+class MultiIndexHash:
+    """
+    Hamming-distance index over 64-bit hashes.
+
+    Hashes are split into chunks, one exact-match table per chunk.
+    Two hashes within `max_distance` bits always share at least one
+    identical chunk, so a lookup only compares against that bucket.
+    """
+
+    def __init__(self, max_distance: int = 7):
+        chunks = 1
+        while chunks <= max_distance:
+            chunks *= 2
+        self.max_distance = max_distance
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self.tables = [defaultdict(set) for _ in range(chunks)]
+        self.hashes = {}
+
+    def split(self, value: int) -> list[int]:
+        value = to_unsigned(value)
+        mask = (1 << self.chunk_bits) - 1
+        return [
+            (value >> (i * self.chunk_bits)) & mask
+            for i in range(self.chunks)
+        ]
+
+    def add(self, key, value: int) -> None:
+        self.hashes[key] = value
+        for table, chunk in zip(self.tables, self.split(value)):
+            table[chunk].add(key)
+
+    def search(self, value: int) -> set:
+        """Return the keys of all hashes within `max_distance` bits."""
+        candidates = set()
+        for table, chunk in zip(self.tables, self.split(value)):
+            candidates |= table.get(chunk, set())
+        return {
+            key for key in candidates
+            if hamming_distance(self.hashes[key], value) <= self.max_distance
+        }
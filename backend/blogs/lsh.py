@@ -0,0 +1,105 @@
+import hashlib
+import zlib
+import numpy as np
+
+from common.utils import redis_client
+
+
+NUM_PERMUTATIONS = 60
+BANDS = 20
+ROWS = NUM_PERMUTATIONS // BANDS
+# Mersenne prime, with a, b and the token hashes below it
+# a * hash + b < 2 ** 63 never overflows int64
+PRIME = (1 << 31) - 1
+
+_rng = np.random.default_rng(seed=20240111)
+_a = _rng.integers(1, PRIME, NUM_PERMUTATIONS, dtype=np.int64)
+_b = _rng.integers(0, PRIME, NUM_PERMUTATIONS, dtype=np.int64)
+
+
+def tokenize(text: str) -> set[str]:
+    return set(text.lower().split())
+
+
+def minhash(text: str) -> np.ndarray | None:
+    """MinHash signature over the words of a text."""
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+    hashes = np.fromiter(
+        (zlib.crc32(token.encode()) % PRIME for token in tokens),
+        dtype=np.int64,
+        count=len(tokens),
+    )
+    permuted = (np.outer(_a, hashes) + _b[:, None]) % PRIME
+    return permuted.min(axis=1)
+
+
+def estimate_jaccard(first: np.ndarray, second: np.ndarray) -> float:
+    return float(np.mean(first == second))
+
+
+def signature_buckets(signature: np.ndarray) -> list[str]:
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS].tobytes()
+        digest = hashlib.blake2b(rows, digest_size=8).hexdigest()
+        buckets.append(f'{band}:{digest}')
+    return buckets
+
+
+class DescriptionIndex:
+    """
+    LSH banding index over post descriptions, stored in redis.
+
+    Each band of a post signature is a bucket (a redis set of post ids).
+    Posts sharing at least one bucket are candidates for being similar,
+    so a lookup reads `BANDS` small sets instead of every description.
+    """
+
+    prefix = 'lsh:descriptions'
+
+    def bucket_key(self, bucket: str) -> str:
+        return f'{self.prefix}:{bucket}'
+
+    def post_key(self, post_id: int) -> str:
+        return f'post:{post_id}:lsh_buckets'
+
+    def add(self, post_id: int, description: str) -> None:
+        self.remove(post_id)
+        signature = minhash(description)
+        if signature is None:
+            return
+
+        keys = [self.bucket_key(b) for b in signature_buckets(signature)]
+        with redis_client.pipeline(transaction=True) as pipeline:
+            for key in keys:
+                pipeline.sadd(key, post_id)
+            pipeline.sadd(self.post_key(post_id), *keys)
+            pipeline.execute()
+
+    def remove(self, post_id: int) -> None:
+        post_key = self.post_key(post_id)
+        keys = redis_client.smembers(post_key)
+        if keys:
+            with redis_client.pipeline(transaction=True) as pipeline:
+                for key in keys:
+                    pipeline.srem(key, post_id)
+                pipeline.delete(post_key)
+                pipeline.execute()
+
+    def query(self, description: str) -> set[int]:
+        """Ids of posts whose descriptions probably resemble the text."""
+        signature = minhash(description)
+        if signature is None:
+            return set()
+        keys = [self.bucket_key(b) for b in signature_buckets(signature)]
+        return set(map(int, redis_client.sunion(keys)))
+
+    def query_post(self, post_id: int) -> set[int]:
+        keys = redis_client.smembers(self.post_key(post_id))
+        if not keys:
+            return set()
+        similar = set(map(int, redis_client.sunion(list(keys))))
+        similar.discard(post_id)
+        return similar
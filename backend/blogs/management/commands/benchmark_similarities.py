@@ -0,0 +1,345 @@
+import random
+import string
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+from collections import defaultdict
+from pathlib import Path
+from PIL import Image, ImageDraw, ImageEnhance
+from django.core.management.base import BaseCommand, CommandParser
+from sklearn.metrics.pairwise import cosine_similarity
+
+from blogs.hashing import MultiIndexHash, dhash, hamming_distance
+from blogs.lsh import estimate_jaccard, minhash, signature_buckets
+from blogs.similarities import Recognizer, decode_image
+
+
+class SimilarityBackend:
+    """Builds an index over the corpus and answers top-k queries."""
+
+    name = None
+
+    def build(self, corpus) -> None:
+        raise NotImplementedError
+
+    def query(self, index: int, k: int) -> list[int]:
+        raise NotImplementedError
+
+    @staticmethod
+    def top_k(scores: np.ndarray, index: int, k: int) -> list[int]:
+        scores = scores.astype(float)
+        scores[index] = -np.inf
+        # the queried item itself is never returned
+        k = min(k, len(scores) - 1)
+        if k <= 0:
+            return []
+        if k == len(scores) - 1:
+            best = np.arange(len(scores))
+        else:
+            best = np.argpartition(-scores, k)[:k]
+        return best[np.argsort(-scores[best])][:k].tolist()
+
+
+##############################################
+# DESCRIPTIONS
+class CurrentTextBackend(SimilarityBackend):
+    name = 'current'
+
+    def build(self, corpus):
+        self.corpus = corpus
+
+    def query(self, index, k):
+        first = self.corpus[index]
+        scores = np.array([
+            Recognizer.compare_descriptions(first, second)
+            for second in self.corpus
+        ])
+        return self.top_k(scores, index, k)
+
+
+class VectorizedTextBackend(SimilarityBackend):
+    name = 'vectorized'
+
+    def build(self, corpus):
+        vectors = Recognizer.generate_descriptions_embeddings(corpus)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = vectors / np.maximum(norms, 1)
+
+    def query(self, index, k):
+        scores = self.vectors @ self.vectors[index]
+        return self.top_k(scores, index, k)
+
+
+class RandomProjectionBackend(SimilarityBackend):
+    """Approximate cosine search with random-hyperplane LSH tables."""
+
+    name = 'ann'
+    tables = 8
+    bits = 12
+
+    def vectorize(self, corpus) -> np.ndarray:
+        vectors = np.asarray(corpus, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def build(self, corpus):
+        self.vectors = self.vectorize(corpus)
+        rng = np.random.default_rng(0)
+        dims = self.vectors.shape[1]
+        self.planes = rng.standard_normal((self.tables, dims, self.bits))
+        self.weights = 1 << np.arange(self.bits)
+        self.keys = [
+            ((self.vectors @ planes) > 0) @ self.weights
+            for planes in self.planes
+        ]
+        self.buckets = []
+        for keys in self.keys:
+            buckets = defaultdict(list)
+            for i, key in enumerate(keys):
+                buckets[key].append(i)
+            self.buckets.append(buckets)
+
+    def query(self, index, k):
+        candidates = set()
+        for keys, buckets in zip(self.keys, self.buckets):
+            candidates.update(buckets[keys[index]])
+        candidates.discard(index)
+        candidates = np.fromiter(candidates, dtype=int)
+        if not len(candidates):
+            return []
+        scores = self.vectors[candidates] @ self.vectors[index]
+        order = np.argsort(-scores)[:k]
+        return candidates[order].tolist()
+
+
+class RandomProjectionTextBackend(RandomProjectionBackend):
+    def vectorize(self, corpus):
+        vectors = Recognizer.generate_descriptions_embeddings(corpus)
+        return super().vectorize(vectors)
+
+
+class MinHashTextBackend(SimilarityBackend):
+    name = 'hashed'
+
+    def build(self, corpus):
+        self.signatures = [minhash(description) for description in corpus]
+        self.buckets = defaultdict(set)
+        for i, signature in enumerate(self.signatures):
+            for bucket in signature_buckets(signature):
+                self.buckets[bucket].add(i)
+
+    def query(self, index, k):
+        signature = self.signatures[index]
+        candidates = set()
+        for bucket in signature_buckets(signature):
+            candidates |= self.buckets[bucket]
+        candidates.discard(index)
+        ranked = sorted(
+            candidates,
+            key=lambda i: estimate_jaccard(signature, self.signatures[i]),
+            reverse=True,
+        )
+        return ranked[:k]
+
+
+##############################################
+# IMAGES
+class CurrentImageBackend(SimilarityBackend):
+    """Full similarity matrix, as stored by Recognizer."""
+
+    name = 'current'
+
+    def build(self, corpus):
+        self.matrix = cosine_similarity(corpus['features'])
+
+    def query(self, index, k):
+        return self.top_k(self.matrix[index].copy(), index, k)
+
+
+class VectorizedImageBackend(SimilarityBackend):
+    name = 'vectorized'
+
+    def build(self, corpus):
+        features = corpus['features']
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        self.vectors = features / np.maximum(norms, 1e-12)
+
+    def query(self, index, k):
+        return self.top_k(self.vectors @ self.vectors[index], index, k)
+
+
+class RandomProjectionImageBackend(RandomProjectionBackend):
+    def build(self, corpus):
+        super().build(corpus['features'])
+
+
+class PerceptualHashImageBackend(SimilarityBackend):
+    name = 'hashed'
+
+    def build(self, corpus):
+        self.index = MultiIndexHash(max_distance=15)
+        self.hashes = []
+        for i, path in enumerate(corpus['paths']):
+            with Image.open(path) as img:
+                value = dhash(img)
+            self.hashes.append(value)
+            self.index.add(i, value)
+
+    def query(self, index, k):
+        value = self.hashes[index]
+        candidates = self.index.search(value) - {index}
+        ranked = sorted(
+            candidates,
+            key=lambda i: hamming_distance(value, self.hashes[i]),
+        )
+        return ranked[:k]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark similarity backends on a synthetic corpus: latency, '
+        'throughput, peak memory and overlap@k against exact cosine.'
+    )
+
+    text_backends = [
+        CurrentTextBackend,
+        VectorizedTextBackend,
+        RandomProjectionTextBackend,
+        MinHashTextBackend,
+    ]
+    image_backends = [
+        CurrentImageBackend,
+        VectorizedImageBackend,
+        RandomProjectionImageBackend,
+        PerceptualHashImageBackend,
+    ]
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--size', type=int, default=400)
+        parser.add_argument('--variants', type=int, default=4)
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--k', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--features',
+            choices=['pixels', 'vgg16'],
+            default='pixels',
+            help='Image features: downscaled pixels or VGG16 embeddings.',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        size = options['size']
+        variants = options['variants']
+        queries = self.rng.sample(range(size), min(options['queries'], size))
+        k = options['k']
+
+        descriptions = self.generate_descriptions(size, variants)
+        self.stdout.write(f'Descriptions: {size}, queries: {len(queries)}')
+        self.run(self.text_backends, descriptions, queries, k)
+
+        with tempfile.TemporaryDirectory() as root:
+            paths = self.generate_images(Path(root), size, variants)
+            features = self.extract_features(paths, options['features'])
+            corpus = {'paths': paths, 'features': features}
+            self.stdout.write(
+                f'\nImages: {size}, features: {options["features"]}, '
+                f'queries: {len(queries)}'
+            )
+            self.run(self.image_backends, corpus, queries, k)
+
+    def run(self, backends, corpus, queries, k):
+        header = (
+            f'{"backend":<12}{"build s":>10}{"ms/query":>10}'
+            f'{"queries/s":>11}{"peak MB":>9}{"overlap@k":>11}'
+        )
+        self.stdout.write(header)
+
+        baseline = None
+        for backend_class in backends:
+            backend = backend_class()
+            tracemalloc.start()
+            start = time.perf_counter()
+            backend.build(corpus)
+            build_time = time.perf_counter() - start
+
+            results = []
+            latencies = []
+            for index in queries:
+                start = time.perf_counter()
+                results.append(backend.query(index, k))
+                latencies.append(time.perf_counter() - start)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            # the first backend of each group is exact
+            if baseline is None:
+                baseline = results
+            overlap = np.mean([
+                len(set(result) & set(expected)) / k
+                for result, expected in zip(results, baseline)
+            ])
+            total = sum(latencies)
+            self.stdout.write(
+                f'{backend.name:<12}{build_time:>10.3f}'
+                f'{total / len(latencies) * 1000:>10.3f}'
+                f'{len(latencies) / total if total else 0:>11.1f}'
+                f'{peak / 2 ** 20:>9.1f}{overlap:>11.2f}'
+            )
+
+    def generate_descriptions(self, size: int, variants: int) -> list[str]:
+        """Groups of descriptions that differ by a few words."""
+        rng = self.rng
+        vocabulary = [
+            ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+            for _ in range(2000)
+        ]
+        descriptions = []
+        while len(descriptions) < size:
+            base = rng.sample(vocabulary, rng.randint(8, 16))
+            for _ in range(variants):
+                words = base.copy()
+                for _ in range(rng.randint(0, 3)):
+                    words[rng.randrange(len(words))] = rng.choice(vocabulary)
+                descriptions.append(' '.join(words))
+        return descriptions[:size]
+
+    def generate_images(self, root: Path, size: int, variants: int):
+        """Groups of images: random shapes, then shifted and re-lit copies."""
+        rng = self.rng
+        paths = []
+        while len(paths) < size:
+            base = Image.new('RGB', (700, 450), self.random_color())
+            draw = ImageDraw.Draw(base)
+            for _ in range(rng.randint(3, 8)):
+                x, y = rng.randint(0, 600), rng.randint(0, 350)
+                box = (x, y, x + rng.randint(40, 300), y + rng.randint(40, 300))
+                shape = rng.choice([draw.rectangle, draw.ellipse])
+                shape(box, fill=self.random_color())
+
+            for variant in range(variants):
+                img = base.rotate(0, translate=(variant * 3, variant * 2))
+                img = ImageEnhance.Brightness(img).enhance(
+                    rng.uniform(0.9, 1.1),
+                )
+                path = root / f'{len(paths)}.jpg'
+                img.save(path, quality=rng.randint(60, 95))
+                paths.append(str(path))
+        return paths[:size]
+
+    def random_color(self):
+        return tuple(self.rng.randint(0, 255) for _ in range(3))
+
+    @staticmethod
+    def extract_features(paths: list[str], kind: str) -> np.ndarray:
+        if kind == 'vgg16':
+            return Recognizer().generate_images_embeddings(paths)
+        features = []
+        for path in paths:
+            img = Image.fromarray(decode_image(path).astype(np.uint8))
+            img = img.convert('L').resize((32, 20), Image.BILINEAR)
+            features.append(np.asarray(img, dtype=np.float32).ravel())
+        features = np.vstack(features)
+        return features - features.mean(axis=0)
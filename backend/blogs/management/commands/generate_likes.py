@@ -30,6 +30,7 @@ class Command(BaseCommand):
                 like = ThroughModel(post_id=post.id, user_id=user.id)
                 likes.append(like)
             ThroughModel.objects.bulk_create(likes, ignore_conflicts=True)
+            Post.objects.sync_counters()
             self.stdout.write(f'{count} likes generated!')
         except TypeError:
             self.stderr.write('Please provide a count of likes to generate!')
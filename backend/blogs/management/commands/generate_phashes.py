@@ -0,0 +1,22 @@
+from PIL import Image, UnidentifiedImageError
+from django.core.management.base import BaseCommand
+
+from blogs.hashing import dhash, to_signed
+from blogs.models import PostMedia
+
+
+class Command(BaseCommand):
+    help = 'Compute perceptual hashes for post media uploaded without them'
+
+    def handle(self, *args, **options):
+        updated = []
+        for media in PostMedia.objects.filter(phash=None).iterator():
+            try:
+                with Image.open(media.file) as img:
+                    img.draft('L', (64, 64))
+                    media.phash = to_signed(dhash(img))
+            except (UnidentifiedImageError, FileNotFoundError):
+                continue
+            updated.append(media)
+        PostMedia.objects.bulk_update(updated, ['phash'], batch_size=500)
+        self.stdout.write(f'{len(updated)} hashes generated!')
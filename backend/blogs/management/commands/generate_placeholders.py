@@ -0,0 +1,46 @@
+from PIL import Image, UnidentifiedImageError
+from django.core.management.base import BaseCommand
+from django.db import models
+
+from blogs.models import MediaBlob, PostMedia
+from common.images import make_placeholder
+
+
+class Command(BaseCommand):
+    help = 'Compute placeholders and rendition sizes for processed post media'
+
+    def handle(self, *args, **options):
+        fields = ['width', 'height', 'sizes', 'placeholder']
+        updated = []
+        media = PostMedia.objects.filter(
+            models.Q(placeholder='') | models.Q(sizes={}),
+        ).exclude(renditions={})
+        for obj in media.iterator():
+            storage = obj.file.storage
+            try:
+                with storage.open(obj.file.name) as file:
+                    with Image.open(file) as img:
+                        obj.width, obj.height = img.size
+                obj.sizes = {}
+                for name, formats in obj.renditions.items():
+                    with storage.open(formats['jpeg']) as file:
+                        with Image.open(file) as img:
+                            obj.sizes[name] = {'width': img.width, 'height': img.height}
+                with storage.open(obj.renditions['thumbnail']['jpeg']) as file:
+                    with Image.open(file) as img:
+                        obj.placeholder = make_placeholder(img.convert('RGB'))
+            except (UnidentifiedImageError, FileNotFoundError, KeyError):
+                continue
+            updated.append(obj)
+
+        PostMedia.objects.bulk_update(updated, fields, batch_size=500)
+        blobs = {obj.blob_id: obj for obj in updated if obj.blob_id}
+        MediaBlob.objects.bulk_update(
+            [
+                MediaBlob(id=blob_id, **{f: getattr(obj, f) for f in fields})
+                for blob_id, obj in blobs.items()
+            ],
+            fields,
+            batch_size=500,
+        )
+        self.stdout.write(f'{len(updated)} placeholders generated!')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from blogs.models import MediaBlob, PostMedia
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive renditions for post media uploaded without them'
+
+    def handle(self, *args, **options):
+        count = 0
+        for media in PostMedia.objects.filter(renditions={}).iterator():
+            original = media.file.name
+            try:
+                if not media.reuse_blob():
+                    media.process_image()
+                    media.register_blob()
+            except FileNotFoundError:
+                continue
+            if not media.renditions:
+                continue
+            media.save(
+                update_fields=['file', 'blob', *MediaBlob.shared_fields],
+            )
+            media.file.storage.delete(original)
+            count += 1
+        self.stdout.write(f'{count} images processed!')
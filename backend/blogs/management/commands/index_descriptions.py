@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from blogs.lsh import DescriptionIndex
+from blogs.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the LSH index over post descriptions'
+
+    def handle(self, *args, **options):
+        index = DescriptionIndex()
+        posts = Post.objects.values_list('id', 'description')
+        count = 0
+        for post_id, description in posts.iterator():
+            index.add(post_id, description)
+            count += 1
+        self.stdout.write(f'{count} descriptions indexed!')
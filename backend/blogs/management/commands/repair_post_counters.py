@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blogs.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recount post likes and set missing covers'
+
+    def handle(self, *args, **options):
+        count = Post.objects.sync_counters()
+        self.stdout.write(f'{count} posts repaired!')
@@ -1,21 +1,93 @@
 from django.db import models
-from django.db.models.functions import Concat
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce, Concat
+from django.db.models.lookups import IsNull
 from tree_queries.query import TreeQuerySet
 
 
-class PostManager(models.Manager):
-    def annotated(self):
+def media_url(expression):
+    return models.Case(
+        models.When(
+            IsNull(expression, False),
+            then=Concat(models.Value('/media/'), expression),
+        ),
+        output_field=models.CharField(),
+    )
+
+
+class PostQuerySet(models.QuerySet):
+    def with_files(self):
+        """
+        Annotate the grid thumbnail of the post cover,
+        as `file` (jpeg, or the original file) and `file_webp`,
+        with its inline `placeholder` and the `width`/`height`
+        of the thumbnail.
+        """
+
+        return self.alias(
+            cover_renditions=models.F('cover__renditions'),
+            cover_sizes=models.F('cover__sizes'),
+        ).annotate(
+            file=media_url(
+                Coalesce(
+                    KT('cover_renditions__thumbnail__jpeg'),
+                    'cover__file',
+                    output_field=models.CharField(),
+                ),
+            ),
+            file_webp=media_url(KT('cover_renditions__thumbnail__webp')),
+            placeholder=models.F('cover__placeholder'),
+            width=Cast(
+                KT('cover_sizes__thumbnail__width'),
+                models.PositiveIntegerField(),
+            ),
+            height=Cast(
+                KT('cover_sizes__thumbnail__height'),
+                models.PositiveIntegerField(),
+            ),
+        )
+
+    def with_phash(self):
+        """Annotate the perceptual hash of the post cover."""
+        return self.annotate(phash=models.F('cover__phash'))
+
+    def sync_counters(self) -> int:
+        """
+        Recount likes and set missing covers from the related rows,
+        returns the number of repaired posts.
+        """
         from blogs.models import PostMedia
 
-        subquery = PostMedia.objects.filter(post=models.OuterRef('pk'))
-        objs = self.exclude(archived=True).annotate(
-            likes_count=models.Count('likes'),
-            file=Concat(
-                models.Value('/media/'),
-                models.Subquery(subquery.values('file')[:1]),
-                output_field=models.CharField()
-            )
-        ).select_related('owner', 'owner__privacy')
+        likes = (
+            self.model.likes.through.objects.
+            filter(post=models.OuterRef('pk')).
+            values('post').
+            annotate(count=models.Count('*')).
+            values('count')
+        )
+        first_media = (
+            PostMedia.objects.
+            filter(post=models.OuterRef('pk')).
+            order_by('id').
+            values('id')[:1]
+        )
+        likes_count = Coalesce(models.Subquery(likes), 0)
+        recounted = self.exclude(likes_count=likes_count).update(
+            likes_count=likes_count,
+        )
+        covered = self.filter(
+            cover=None,
+            files__isnull=False,
+        ).distinct().update(cover_id=models.Subquery(first_media))
+        return recounted + covered
+
+
+class PostManager(models.Manager.from_queryset(PostQuerySet)):
+    def annotated(self):
+        objs = self.exclude(archived=True).with_files().select_related(
+            'owner',
+            'owner__privacy',
+        )
         return objs
 
 
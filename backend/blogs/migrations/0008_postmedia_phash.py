@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0007_alter_post_likes_alter_post_saved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postmedia',
+            name='phash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0008_postmedia_phash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postmedia',
+            name='is_ready',
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0009_postmedia_is_ready'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postmedia',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0011_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='is_ready',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0012_story_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mediablob',
+            name='placeholder',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='mediablob',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='postmedia',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='postmedia',
+            name='placeholder',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='postmedia',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
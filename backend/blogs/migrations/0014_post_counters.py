@@ -0,0 +1,24 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0013_media_placeholders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='cover',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='blogs.postmedia'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
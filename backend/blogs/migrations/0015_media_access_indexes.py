@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:41
+
+from django.db import migrations, models
+
+
+def fill_story_stems(apps, schema_editor):
+    Story = apps.get_model('blogs', 'Story')
+    stories = Story.objects.exclude(renditions={}).only('id', 'renditions')
+    for story in stories.iterator():
+        path = story.renditions['full']['jpeg']
+        story.stem = path.rsplit('/', 1)[-1].split('.')[0]
+        story.save(update_fields=['stem'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0014_post_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='stem',
+            field=models.CharField(blank=True, db_index=True, max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='postmedia',
+            name='file',
+            field=models.FileField(db_index=True, upload_to='posts/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='story',
+            name='img',
+            field=models.ImageField(db_index=True, upload_to='stories/%Y/%m/%d/'),
+        ),
+        migrations.RunPython(fill_story_stems, migrations.RunPython.noop),
+    ]
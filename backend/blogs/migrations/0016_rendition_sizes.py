@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blogs', '0015_media_access_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='sizes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='postmedia',
+            name='sizes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -1,14 +1,38 @@
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.generic.list import ListView
 from django.views import View
 
+from common.pagination import DEFAULT_ORDERING, paginate_keyset
 from blogs.models import Post
+from blogs.viewer import with_viewer_state
 
 
 class PostsMixin(ListView):
+    """Posts list paginated by `?cursor=` instead of page numbers."""
+
     template_name = 'blogs/posts.html'
     context_object_name = 'posts'
     paginate_by = 20
+    keyset_ordering = DEFAULT_ORDERING
+
+    def paginate_queryset(self, queryset, page_size):
+        cursor = self.request.GET.get('cursor')
+        try:
+            posts, self.next_cursor = paginate_keyset(
+                queryset,
+                cursor,
+                page_size,
+                self.keyset_ordering,
+            )
+        except ValueError as exc:
+            raise Http404(str(exc))
+        posts = with_viewer_state(self.request.user, posts)
+        return (None, None, posts, bool(cursor or self.next_cursor))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.next_cursor
+        return context
 
 
 class PostActionMixin(View):
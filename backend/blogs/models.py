@@ -1,18 +1,37 @@
-from io import BytesIO
+import hashlib
+import logging
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
-from PIL import Image, UnidentifiedImageError
 from django.utils import timezone
-from django.db import models, transaction
+from django.utils.functional import cached_property
+from django.db import IntegrityError, models, transaction
 from django.urls import reverse
 from django.contrib.contenttypes.fields import GenericRelation
-from django.core.files.base import ContentFile
 from tree_queries.models import TreeNode
 from taggit.managers import TaggableManager
 
+from blogs.hashing import dhash, to_signed
 from blogs.managers import CommentQuerySet, PostManager
+from common.images import (
+    FORMATS,
+    RENDITIONS,
+    STORY_RENDITIONS,
+    make_placeholder,
+    make_renditions,
+    open_image,
+    rendition_name,
+    rendition_paths,
+    store_renditions,
+)
 from common.models import BaseModel
 
 
+logger = logging.getLogger(__name__)
+
+
 class BaseMedia(BaseModel):
     class Meta:
         abstract = True
@@ -35,16 +54,61 @@ class Post(BaseMedia):
     actions = GenericRelation('users.Action', related_query_name='post')
     archived = models.BooleanField(default=False)
     tags = TaggableManager(blank=True)
+    # denormalized for listings, see `like` and `PostMedia.set_covers`
+    likes_count = models.PositiveIntegerField(default=0)
+    cover = models.ForeignKey(
+        to='blogs.PostMedia',
+        on_delete=models.SET_NULL,
+        related_name='+',
+        blank=True,
+        null=True,
+    )
 
     objects = PostManager()
 
+    # updated in place by queries, a stale instance must not overwrite them
+    denormalized_fields = ('likes_count', 'cover')
+
     @transaction.atomic
     def save(self, *args, **kwargs):
-        if not self.pk:
+        if self._state.adding:
             self.owner.last_activity = timezone.now()
             self.owner.save()
+        elif kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.denormalized_fields
+            ]
         super().save(*args, **kwargs)
 
+    def like(self, user) -> bool:
+        """Add a like and count it, False if the user already liked the post."""
+        with transaction.atomic():
+            _, created = Post.likes.through.objects.get_or_create(
+                post_id=self.id,
+                user_id=user.id,
+            )
+            if created:
+                Post.objects.filter(id=self.id).update(
+                    likes_count=models.F('likes_count') + 1,
+                )
+        return created
+
+    def unlike(self, user) -> bool:
+        """Remove a like, False if the user did not like the post."""
+        with transaction.atomic():
+            deleted, _ = Post.likes.through.objects.filter(
+                post_id=self.id,
+                user_id=user.id,
+            ).delete()
+            if deleted:
+                Post.objects.filter(id=self.id).update(
+                    likes_count=models.F('likes_count') - deleted,
+                )
+        return bool(deleted)
+
     def get_absolute_url(self):
         return reverse('blogs:post', kwargs={'post_id': self.pk})
 
@@ -62,46 +126,267 @@ class PostMedia(models.Model):
         related_name='files',
         on_delete=models.CASCADE,
     )
-    file = models.FileField(upload_to='posts/%Y/%m/%d/')
+    # indexed, media access is checked by path
+    file = models.FileField(upload_to='posts/%Y/%m/%d/', db_index=True)
+    phash = models.BigIntegerField(blank=True, null=True)
+    is_ready = models.BooleanField(default=True)
+    renditions = models.JSONField(default=dict, blank=True)
+    # size of the full rendition
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    # name -> {'width', 'height'} of every rendition
+    sizes = models.JSONField(default=dict, blank=True)
+    placeholder = models.CharField(max_length=255, blank=True)
+    blob = models.ForeignKey(
+        to='blogs.MediaBlob',
+        related_name='media',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+    )
 
     class Meta:
         verbose_name_plural = 'Posts media'
 
+    @cached_property
+    def digest(self) -> str:
+        return MediaBlob.digest_file(self.file)
+
     def process_image(self):
-        if not self.pk:
+        """
+        Decode the upload once and store every rendition of it,
+        under the content hash of the upload.
+        """
+
+        img = open_image(self.file, RENDITIONS['full'])
+        if img is None:
+            return
+
+        self.phash = to_signed(dhash(img))
+        stem = self.digest
+
+        def path(name, fmt):
+            # the full jpeg stays the canonical file
+            if name == 'full' and fmt == 'jpeg':
+                return f'posts/{stem[:2]}/{stem}.jpg'
+            return rendition_name(name, stem, fmt)
+
+        images = make_renditions(img, RENDITIONS)
+        self.renditions = store_renditions(images, self.file.storage, path)
+        self.file = self.renditions['full']['jpeg']
+        self.width, self.height = images['full'].size
+        self.sizes = {
+            name: {'width': image.width, 'height': image.height}
+            for name, image in images.items()
+        }
+        # grids show the thumbnail, so the placeholder matches its crop
+        self.placeholder = make_placeholder(images['thumbnail'])
+
+    def use_blob(self, blob: 'MediaBlob'):
+        self.blob = blob
+        self.file = blob.file.name
+        for field in MediaBlob.shared_fields:
+            setattr(self, field, getattr(blob, field))
+
+    def reuse_blob(self) -> bool:
+        """Point at the files of an identical earlier upload, if any."""
+        blob = MediaBlob.take(self.digest)
+        if blob is None:
+            return False
+        self.use_blob(blob)
+        return True
+
+    def register_blob(self):
+        """Share the processed files with later identical uploads."""
+        if not self.renditions:
+            return
+        blob = MediaBlob.register(self)
+        paths = rendition_paths(self.file.name, self.renditions)
+        if blob.get_paths() != paths:
+            # an identical upload was stored at the same time
+            for path in paths - blob.get_paths():
+                self.file.storage.delete(path)
+            self.use_blob(blob)
+        self.blob = blob
+
+    def get_rendition_url(self, name: str, fmt: str = 'jpeg') -> str:
+        path = self.renditions.get(name, {}).get(fmt)
+        if path is None:
+            return self.file.url
+        return self.file.storage.url(path)
+
+    @property
+    def url(self):
+        return self.get_rendition_url('medium')
+
+    @property
+    def webp_url(self):
+        if 'medium' in self.renditions:
+            return self.get_rendition_url('medium', 'webp')
+
+    @classmethod
+    def process_many(cls, objs, workers: int | None = None):
+        """
+        Process the images of one upload concurrently.
+        Pillow releases the GIL while decoding, resizing and encoding.
+        A broken file is logged and left as it is.
+        """
+
+        def process(obj):
+            start = time.perf_counter()
             try:
-                img = Image.open(self.file)
-            except UnidentifiedImageError:
-                pass
-            else:
-                if img.mode in ("RGBA", "LA", "P"):
-                    img = img.convert("RGB")
-                size = (350, 225)
-                img = img.resize(size, Image.LANCZOS)
-
-                temp_img = BytesIO()
-                img.save(temp_img, format='JPEG', optimize=True, quality=100)
-                temp_img.seek(0)
-
-                img_name = f"{uuid4()}.jpg"
-                self.file.save(
-                    name=img_name,
-                    content=ContentFile(temp_img.read()),
-                    save=False,
-                )
+                obj.process_image()
+            except OSError:
+                logger.exception('Could not process %s', obj.file.name)
+                return
+            elapsed = time.perf_counter() - start
+            logger.info('Processed %s in %.3fs', obj.file.name, elapsed)
+
+        if not objs:
+            return
+        workers = workers or min(len(objs), os.cpu_count() or 1, 8)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(process, objs))
+        logger.info(
+            'Processed %d images in %.3fs',
+            len(objs),
+            time.perf_counter() - start,
+        )
 
     @classmethod
     def bulk_create_with_processing(cls, objs):
-        # Process images for each object
+        """
+        Store the originals as they are and process them in background.
+        Media stays `is_ready=False` until the worker replaces the file.
+        Uploads identical to an earlier one are never written, they point
+        at the processed files of its blob right away.
+        """
+        from blogs.tasks import process_post_media
+
         for obj in objs:
-            obj.process_image()
+            # hashed from the upload, before it is saved
+            obj.is_ready = obj.reuse_blob()
 
         # Bulk create the objects
-        cls.objects.bulk_create(objs)
+        objs = cls.objects.bulk_create(objs)
+        cls.set_covers(objs)
+        ids = [obj.id for obj in objs if not obj.is_ready]
+        if ids:
+            transaction.on_commit(lambda: process_post_media.delay(ids))
+        return objs
+
+    @staticmethod
+    def set_covers(objs):
+        """Make the first image of each post its cover, unless it has one."""
+        covers = {}
+        for obj in objs:
+            covers.setdefault(obj.post_id, obj.id)
+        for post_id, media_id in covers.items():
+            Post.objects.filter(id=post_id, cover=None).update(cover_id=media_id)
 
     def save(self, *args, **kwargs):
-        self.process_image()
+        created = not self.pk
+        if created and not self.reuse_blob():
+            self.process_image()
+            self.register_blob()
         super().save(*args, **kwargs)
+        if created:
+            self.set_covers([self])
+
+
+class MediaBlob(models.Model):
+    """
+    Processed files of one distinct upload, addressed by its sha256.
+    Identical uploads share the blob instead of being processed again;
+    the files are removed when the last PostMedia using them is deleted.
+    """
+
+    digest = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=255)
+    phash = models.BigIntegerField(blank=True, null=True)
+    renditions = models.JSONField(default=dict, blank=True)
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    sizes = models.JSONField(default=dict, blank=True)
+    placeholder = models.CharField(max_length=255, blank=True)
+    ref_count = models.PositiveIntegerField(default=0)
+
+    # copied to every PostMedia using the blob
+    shared_fields = [
+        'phash',
+        'renditions',
+        'width',
+        'height',
+        'sizes',
+        'placeholder',
+    ]
+
+    def __str__(self):
+        return self.digest
+
+    @staticmethod
+    def digest_file(file) -> str:
+        sha = hashlib.sha256()
+        file.seek(0)
+        for chunk in file.chunks():
+            sha.update(chunk)
+        file.seek(0)
+        return sha.hexdigest()
+
+    def get_paths(self) -> set[str]:
+        return rendition_paths(self.file.name, self.renditions)
+
+    @classmethod
+    @transaction.atomic
+    def take(cls, digest: str) -> 'MediaBlob | None':
+        """Add a reference to the blob with this digest, if it exists."""
+        blob = cls.objects.select_for_update().filter(digest=digest).first()
+        if blob is not None:
+            blob.ref_count = models.F('ref_count') + 1
+            blob.save(update_fields=['ref_count'])
+            blob.refresh_from_db(fields=['ref_count'])
+        return blob
+
+    @classmethod
+    def register(cls, media: PostMedia) -> 'MediaBlob':
+        """Store processed media as a blob, or take the existing one."""
+        try:
+            with transaction.atomic():
+                return cls.objects.create(
+                    digest=media.digest,
+                    file=media.file.name,
+                    ref_count=1,
+                    **{
+                        field: getattr(media, field)
+                        for field in cls.shared_fields
+                    },
+                )
+        except IntegrityError:
+            return cls.take(media.digest)
+
+    @classmethod
+    @transaction.atomic
+    def release(cls, blob_id: int):
+        """Drop a reference, deleting the files with the last one."""
+        blob = cls.objects.select_for_update().filter(id=blob_id).first()
+        if blob is None:
+            return
+        if blob.ref_count > 1:
+            blob.ref_count = models.F('ref_count') - 1
+            blob.save(update_fields=['ref_count'])
+            return
+
+        digest, paths, storage = blob.digest, blob.get_paths(), blob.file.storage
+        blob.delete()
+
+        def delete_files():
+            # the same bytes may have been uploaded again in the meantime
+            if not cls.objects.filter(digest=digest).exists():
+                for path in paths:
+                    storage.delete(path)
+
+        transaction.on_commit(delete_files)
 
 
 # Post -> Comment
@@ -163,12 +448,44 @@ class Story(BaseMedia):
         on_delete=models.CASCADE,
         related_name='stories',
     )
-    img = models.ImageField(upload_to='stories/%Y/%m/%d/')
+    img = models.ImageField(upload_to='stories/%Y/%m/%d/', db_index=True)
     archived = models.BooleanField(default=False)
+    is_ready = models.BooleanField(default=True)
+    renditions = models.JSONField(default=dict, blank=True)
+    # file name of every rendition, media access is checked by it
+    stem = models.CharField(max_length=32, blank=True, db_index=True)
 
     class Meta:
         verbose_name_plural = 'Stories'
 
     @transaction.atomic
     def save(self, *args, **kwargs):
+        if not self.pk:
+            # processed by a worker after upload
+            self.is_ready = False
         return super().save(*args, **kwargs)
+
+    def process_image(self):
+        """Store the full-screen and tray renditions of the upload."""
+        img = open_image(self.img, STORY_RENDITIONS['full'])
+        if img is None:
+            return
+
+        self.stem = stem = uuid4().hex
+
+        def path(name, fmt):
+            return f'stories/{name}/{stem}.{FORMATS[fmt][1]}'
+
+        images = make_renditions(img, STORY_RENDITIONS)
+        self.renditions = store_renditions(images, self.img.storage, path)
+        self.img = self.renditions['full']['jpeg']
+
+    def get_rendition_url(self, name: str, fmt: str = 'jpeg') -> str:
+        path = self.renditions.get(name, {}).get(fmt)
+        if path is None:
+            return self.img.url
+        return self.img.storage.url(path)
+
+    @property
+    def thumbnail_url(self):
+        return self.get_rendition_url('thumbnail')
@@ -8,6 +8,7 @@ class IsOwner(BasePermission):
             'update',
             'partial_update',
             'archive',
+            'media_status',
         ]:
             return request.user == obj.owner
         return True
@@ -15,7 +16,7 @@ class IsOwner(BasePermission):
 
 class PostAuthenticated(BasePermission):
     def has_permission(self, request, view):
-        safe_views = ['list']
+        safe_views = ['list', 'trending']
         return bool(
             view.action in safe_views or
             request.user and
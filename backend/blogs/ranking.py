@@ -0,0 +1,204 @@
+import time
+import numpy as np
+
+from datetime import timedelta
+from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from common.cache import user_scope, version_key
+from common.utils import redis_client
+from blogs.models import Comment, Post
+from blogs.timelines import (
+    ACTIVE_USERS_KEY,
+    TIMELINE_TTL,
+    Timeline,
+    mark_active,
+    ranked_key,
+    timeline_key,
+)
+from users.vip import get_vip_user_ids
+
+
+# newest timeline posts that are scored for each user
+RANKED_CANDIDATES = 500
+RANKING_BATCH = 100
+# scores are recomputed by the beat schedule before they expire
+RANKED_FEED_TTL = 60 * 60
+# comments older than this do not count in the author affinity
+AFFINITY_WINDOW = timedelta(days=30)
+
+RECENCY_HALF_LIFE = 24  # hours
+RECENCY_WEIGHT = 1.0
+ENGAGEMENT_WEIGHT = 0.6
+AFFINITY_WEIGHT = 0.8
+VIP_BOOST = 0.5
+
+
+def get_candidates(user_ids: list[int]) -> dict[int, list[int]]:
+    """Newest post ids of the users timelines."""
+    with redis_client.pipeline(transaction=False) as pipeline:
+        for user_id in user_ids:
+            pipeline.zrevrange(timeline_key(user_id), 0, RANKED_CANDIDATES - 1)
+        timelines = pipeline.execute()
+    return {
+        user_id: [int(post_id) for post_id in ids]
+        for user_id, ids in zip(user_ids, timelines)
+        if ids
+    }
+
+
+def get_post_stats(post_ids: set[int]) -> dict[int, tuple]:
+    """(owner id, created at, likes, comments, saves) of each post."""
+    comments = (
+        Comment.objects.
+        filter(post=models.OuterRef('pk')).
+        values('post').
+        annotate(count=models.Count('*')).
+        values('count')
+    )
+    saves = (
+        Post.saved.through.objects.
+        filter(post=models.OuterRef('pk')).
+        values('post').
+        annotate(count=models.Count('*')).
+        values('count')
+    )
+    posts = Post.objects.filter(id__any=post_ids, archived=False).annotate(
+        comments_count=Coalesce(models.Subquery(comments), 0),
+        saves_count=Coalesce(models.Subquery(saves), 0),
+    ).values_list(
+        'id',
+        'owner_id',
+        'created_at',
+        'likes_count',
+        'comments_count',
+        'saves_count',
+    )
+    return {post[0]: post[1:] for post in posts}
+
+
+def get_affinities(user_ids: list[int], author_ids: set[int]) -> dict[tuple, int]:
+    """Likes and recent comments of each user on the posts of each author."""
+    likes = (
+        Post.likes.through.objects.
+        filter(user_id__any=user_ids, post__owner_id__any=author_ids).
+        values_list('user_id', 'post__owner_id').
+        annotate(count=models.Count('*'))
+    )
+    comments = (
+        Comment.objects.
+        filter(
+            owner_id__any=user_ids,
+            post__owner_id__any=author_ids,
+            created_at__gte=timezone.now() - AFFINITY_WINDOW,
+        ).
+        values_list('owner_id', 'post__owner_id').
+        annotate(count=models.Count('*'))
+    )
+    affinities = {}
+    for user_id, author_id, count in [*likes, *comments]:
+        pair = (user_id, author_id)
+        affinities[pair] = affinities.get(pair, 0) + count
+    return affinities
+
+
+def score_posts(
+    age_hours: np.ndarray,
+    likes: np.ndarray,
+    comments: np.ndarray,
+    saves: np.ndarray,
+    affinity: np.ndarray,
+    is_vip: np.ndarray,
+) -> np.ndarray:
+    """
+    One score per (user, post) pair, all arguments are aligned arrays.
+
+    Recency decays by half every `RECENCY_HALF_LIFE` hours, engagement is
+    the interactions per hour since publication (saves and comments weigh
+    more than likes), affinity grows with the interactions of the user
+    with the author, on a log scale.
+    """
+
+    recency = np.exp2(-age_hours / RECENCY_HALF_LIFE)
+    velocity = (likes + 2 * comments + 3 * saves) / (age_hours + 2)
+    return (
+        RECENCY_WEIGHT * recency +
+        ENGAGEMENT_WEIGHT * np.log1p(velocity) +
+        AFFINITY_WEIGHT * np.log1p(affinity) +
+        VIP_BOOST * is_vip
+    )
+
+
+def rank_feeds(user_ids: list[int]) -> int:
+    """Score the timelines of a batch of users and store them, ranked."""
+    candidates = get_candidates(user_ids)
+    stats = get_post_stats({
+        post_id for post_ids in candidates.values() for post_id in post_ids
+    })
+    if not stats:
+        return 0
+
+    pairs = [
+        (user_id, post_id)
+        for user_id, post_ids in candidates.items()
+        for post_id in post_ids
+        if post_id in stats
+    ]
+    authors = {owner_id for owner_id, *_ in stats.values()}
+    affinities = get_affinities(list(candidates), authors)
+    vip_users = get_vip_user_ids()
+
+    now = timezone.now()
+    columns = list(zip(*(stats[post_id] for _, post_id in pairs)))
+    owners, created_at, likes, comments, saves = columns
+    scores = score_posts(
+        age_hours=np.array([(now - date).total_seconds() / 3600 for date in created_at]),
+        likes=np.array(likes, dtype=float),
+        comments=np.array(comments, dtype=float),
+        saves=np.array(saves, dtype=float),
+        affinity=np.array([
+            affinities.get((user_id, owner_id), 0)
+            for (user_id, _), owner_id in zip(pairs, owners)
+        ], dtype=float),
+        is_vip=np.array([owner_id in vip_users for owner_id in owners], dtype=float),
+    )
+
+    ranked = {}
+    for (user_id, post_id), score in zip(pairs, scores.tolist()):
+        ranked.setdefault(user_id, {})[post_id] = score
+    # replaced atomically, readers never see a missing or partial feed
+    with redis_client.pipeline(transaction=True) as pipeline:
+        for user_id, post_scores in ranked.items():
+            key = ranked_key(user_id)
+            pipeline.delete(key)
+            pipeline.zadd(key, post_scores)
+            pipeline.expire(key, RANKED_FEED_TTL)
+            pipeline.incr(version_key(user_scope(user_id)))
+        pipeline.execute()
+    return len(ranked)
+
+
+def active_users():
+    """Users that read their feed recently, their timelines did not expire."""
+    since = time.time() - TIMELINE_TTL
+    redis_client.zremrangebyscore(ACTIVE_USERS_KEY, '-inf', f'({since}')
+    for user_id, _ in redis_client.zscan_iter(ACTIVE_USERS_KEY, count=1000):
+        yield int(user_id)
+
+
+class RankedTimeline(Timeline):
+    """
+    Home feed ordered by the scores of `rank_feeds`,
+    the chronological timeline until the user is scored.
+    """
+
+    def __init__(self, user_id: int):
+        super().__init__(user_id)
+        self.key = ranked_key(user_id)
+
+    def load(self) -> Timeline:
+        if not redis_client.exists(self.key):
+            return Timeline(self.user_id).load()
+        mark_active(self.user_id)
+        return self
@@ -1,21 +1,48 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save, post_delete
-from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
 
 from common import redis_client
-from blogs.models import Post, Story, UninterestingPost
-from blogs.tasks import archive_story_scheduler, remove_similar_posts
+from common.cache import bump, bump_user, invalidate, user_scope
+from blogs import trending
+from blogs.lsh import DescriptionIndex
+from blogs.models import (
+    Comment,
+    MediaBlob,
+    Post,
+    PostMedia,
+    Story,
+    UninterestingPost,
+)
+from blogs.tasks import (
+    archive_story_scheduler,
+    fan_out_post,
+    process_story,
+    remove_similar_posts,
+    retract_post,
+)
 from users.models import User
 from users.recommendations import Recommender
 from users.utils import recommend_users
 
 
+def bump_savers(post_id: int):
+    """Outdate the cached saved posts of the users that saved the post."""
+    savers = Post.saved.through.objects.filter(post_id=post_id)
+    bump(*map(user_scope, savers.values_list('user_id', flat=True)))
+
+
 @receiver(post_save, sender=Post)
 def create_post(instance, created, **kwargs):
     owner = instance.owner
-    cached = []
 
+    # keep description similarity index up to date
+    DescriptionIndex().add(instance.id, instance.description)
+
+    bump_user(owner)
     if created:
+        transaction.on_commit(lambda: fan_out_post.delay(instance.id))
+
         # get post owner followers
         followers = owner.followers.values_list('from_user_id', flat=True)
         # get the followers of the user's followers
@@ -28,17 +55,30 @@ def create_post(instance, created, **kwargs):
             r = Recommender(user)
             r.generate_recommendations()
     else:
-        cached.append('saved_posts')
+        bump_savers(instance.id)
         if instance.archived != instance.old_archived:
-            # update cache
-            cached.append('archived_posts')
-    cache.delete_many(cached)
+            invalidate('archived_posts', owner.id)
+            if instance.archived:
+                transaction.on_commit(
+                    lambda: retract_post.delay(instance.id, owner.id),
+                )
+            else:
+                transaction.on_commit(lambda: fan_out_post.delay(instance.id))
+
+
+@receiver(pre_delete, sender=Post)
+def delete_saved_post(instance, **kwargs):
+    # the saves are deleted with the post
+    bump_savers(instance.id)
+    # and so are its tags
+    trending.forget(instance.id, [tag.name for tag in instance.tags.all()])
 
 
 @receiver(post_delete, sender=Post)
 def delete_post(instance, **kwargs):
-    cache.delete_many(['saved_posts', 'archived_posts'])
     owner = instance.owner
+    invalidate('archived_posts', owner.id)
+    bump_user(owner)
 
     # get post owner followers
     followers = owner.followers.values_list('from_user_id', flat=True)
@@ -51,8 +91,9 @@ def delete_post(instance, **kwargs):
         distinct()
     )
 
-    # remove post views rank
-    redis_client.zrem('post_rank', instance.id)
+    post_id = instance.id
+    transaction.on_commit(lambda: retract_post.delay(post_id, owner.id))
+    DescriptionIndex().remove(instance.id)
 
     # remove post from recommendations
     for username in followers_owner_followers:
@@ -61,43 +102,81 @@ def delete_post(instance, **kwargs):
             redis_client.srem(user_key, instance.id)
 
 
+@receiver(post_delete, sender=PostMedia)
+def release_media_blob(instance, **kwargs):
+    if instance.blob_id:
+        MediaBlob.release(instance.blob_id)
+    # the next image becomes the cover
+    Post.objects.filter(id=instance.post_id, cover=None).sync_counters()
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(instance, created, **kwargs):
+    invalidate('my_comments', instance.owner_id)
+    if created:
+        trending.record_post(instance.post, 'comment')
+
+
+@receiver(post_delete, sender=Comment)
+def delete_comment(instance, **kwargs):
+    invalidate('my_comments', instance.owner_id)
+
+
 @receiver(post_save, sender=Story)
 def archive_story(instance, created, **kwargs):
-    cached = ['stories']
+    # every user sees the stories of everyone else
+    invalidate('stories')
     if created:
+        transaction.on_commit(lambda: process_story.delay(instance.id))
         archive_story_scheduler(
             story_id=instance.id,
             story_date=instance.created_at,
         )
     else:
-        cached.append('archived_stories')
-    cache.delete_many(cached)
+        invalidate('archived_stories', instance.owner_id)
 
 
 @receiver(post_delete, sender=Story)
-def archive_story_on_delete(**kwargs):
-    cache.delete_many(['stories', 'archived_stories'])
+def archive_story_on_delete(instance, **kwargs):
+    invalidate('stories')
+    invalidate('archived_stories', instance.owner_id)
+
+
+@receiver(m2m_changed, sender=Post.saved.through)
+def change_saved_posts(instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # `user.saved` changed
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            bump(user_scope(instance.id))
+    elif action in ('post_add', 'post_remove'):
+        bump(*map(user_scope, pk_set))
+    elif action == 'pre_clear':
+        bump_savers(instance.id)
 
 
 @receiver(post_save, sender=UninterestingPost)
 def add_uninteresting_post(instance, created, **kwargs):
-    cache.delete('uninteresting_posts')
+    invalidate('uninteresting_posts', instance.user_id)
+    bump(user_scope(instance.user_id))
     if created:
         r = Recommender(instance.user)
         recommended = r.get_posts_ids()
 
         # get instance data
-        image = instance.post.files.first().file
+        media = instance.post.files.first()
         description = instance.post.description
         data = [{
-            'file': str(image),
+            'id': instance.post_id,
+            'file': str(media.file),
             'description': description,
+            'phash': media.phash,
         }]
 
         posts = list(
             Post.objects.annotated().
-            filter(id__in=recommended).
-            values('id', 'description', 'file')
+            filter(id__any=recommended).
+            with_phash().
+            values('id', 'description', 'file', 'phash')
         )
 
         if posts:
@@ -106,5 +185,6 @@ def add_uninteresting_post(instance, created, **kwargs):
 
 @receiver(post_delete, sender=UninterestingPost)
 def remove_uninteresting_post(instance, **kwargs):
-    cache.delete('uninteresting_posts')
+    invalidate('uninteresting_posts', instance.user_id)
+    bump(user_scope(instance.user_id))
     recommend_users(instance.user)
@@ -1,51 +1,190 @@
+import multiprocessing
 import pandas as pd
 import numpy as np
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Iterator
+from PIL import Image
+from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
 
+TARGET_SIZE = (225, 350)
+# nearest images stored for each image
+SIMILAR_IMAGES = 50
+# rows of the similarity matrix computed at once
+SIMILARITY_CHUNK = 1024
+
+IMAGES_EMBEDDINGS_PATH = 'media/images_embeddings.h5'
+IMAGES_SIMILARITIES_PATH = 'media/images_similarities.h5'
+
+
+def decode_image(image: str) -> np.ndarray:
+    """Decode and resize an image the way keras `load_img` does."""
+    height, width = TARGET_SIZE
+    with Image.open(image) as img:
+        # decode JPEGs at a reduced scale, still larger than the target
+        img.draft('RGB', (width, height))
+        img = img.convert('RGB').resize((width, height), Image.NEAREST)
+        return np.asarray(img, dtype=np.float32)
+
+
+def decoding_pool(workers: int | None = None) -> ProcessPoolExecutor:
+    """Worker processes for `decode_image`, start one per command run."""
+    context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(workers, mp_context=context)
+
+
+def iter_decoded_batches(
+    images: list[str],
+    batch_size: int = 32,
+    executor: ProcessPoolExecutor | None = None,
+) -> Iterator[tuple[list[str], np.ndarray]]:
+    """
+    Decode images in a process pool and yield them in fixed-size batches.
+    At most two batches are decoded ahead of the consumer,
+    so memory does not grow with the number of images.
+    A pool is started for the call when `executor` is not given.
+    """
+
+    if executor is None:
+        with decoding_pool() as executor:
+            yield from iter_decoded_batches(images, batch_size, executor)
+        return
+
+    pending = deque()
+    images = iter(images)
+    names, arrays = [], []
+
+    def submit(count):
+        for image in images:
+            pending.append((image, executor.submit(decode_image, image)))
+            count -= 1
+            if not count:
+                break
+
+    submit(batch_size * 2)
+    while pending:
+        image, future = pending.popleft()
+        submit(1)
+        names.append(image)
+        arrays.append(future.result())
+        if len(arrays) == batch_size:
+            yield names, np.stack(arrays)
+            names, arrays = [], []
+    if arrays:
+        yield names, np.stack(arrays)
+
+
+def iter_top_similarities(
+    embeddings: np.ndarray,
+    k: int = SIMILAR_IMAGES,
+    chunk_size: int = SIMILARITY_CHUNK,
+) -> Iterator[tuple[int, np.ndarray, np.ndarray]]:
+    """
+    The `k` most similar rows of each row by cosine, as (first row
+    of the chunk, indexes, scores), best first. Only `chunk_size` rows
+    of the similarity matrix are held in memory at once.
+    """
+
+    count = len(embeddings)
+    # the row itself is excluded
+    k = min(k, count - 1)
+    if k <= 0:
+        return
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normalized = embeddings / np.maximum(norms, 1e-12)
+    for start in range(0, count, chunk_size):
+        scores = normalized[start:start + chunk_size] @ normalized.T
+        rows = np.arange(len(scores))
+        scores[rows, start + rows] = -np.inf
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        yield (
+            start,
+            np.take_along_axis(best, order, axis=1),
+            np.take_along_axis(best_scores, order, axis=1),
+        )
+
+
 class Recognizer:
+    target_size = TARGET_SIZE
 
     def __init__(self):
         self.model = self.get_model()
 
-    @staticmethod
-    def get_model():
+    @classmethod
+    def get_model(cls):
         from keras.api.applications.vgg16 import VGG16
 
         return VGG16(weights='imagenet', include_top=False,
-                      pooling='max', input_shape=(225, 350, 3))
+                      pooling='max', input_shape=(*cls.target_size, 3))
 
-    def generate_images_embeddings(self, images: list[str]):
-        from keras.api.preprocessing.image import load_img, img_to_array
-        from keras.api.applications.vgg16 import preprocess_input
+    @staticmethod
+    def load_image(image: str) -> np.ndarray:
+        return decode_image(image)
 
-        importedImages = []
-        for image in images:
-            original = load_img(image, target_size=(225, 350))
-            numpy_image = img_to_array(original)
-            image_batch = np.expand_dims(numpy_image, axis=0) 
-            importedImages.append(image_batch)
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        from keras.api.applications.vgg16 import preprocess_input
 
-        images = np.vstack(importedImages)
         preprocessed = preprocess_input(images)
-        imgs_embedding = self.model.predict(preprocessed)
-        return imgs_embedding
+        return self.model.predict(preprocessed, verbose=0)
+
+    def iter_images_embeddings(
+        self,
+        images: list[str],
+        batch_size: int = 32,
+        executor: ProcessPoolExecutor | None = None,
+    ) -> Iterator[tuple[list[str], np.ndarray]]:
+        for names, batch in iter_decoded_batches(images, batch_size, executor):
+            yield names, self.predict(batch)
+
+    def generate_images_embeddings(self, images: list[str]):
+        embeddings = [e for _, e in self.iter_images_embeddings(images)]
+        return np.vstack(embeddings)
+
+    def store_images_embeddings(
+        self,
+        images: list[str],
+        path: str,
+        executor: ProcessPoolExecutor | None = None,
+    ) -> None:
+        """Append embeddings to a HDF5 table batch by batch."""
+        with pd.HDFStore(path, mode='w') as store:
+            embeddings = self.iter_images_embeddings(images, executor=executor)
+            for names, embeddings in embeddings:
+                index = [name.split('/')[-1].split('.')[0] for name in names]
+                df = pd.DataFrame(embeddings, index=index)
+                df.columns = df.columns.astype(str)
+                store.append('embeddings', df)
 
     def compare_images(self, images: list[str]):
         images_vectors = self.generate_images_embeddings(images)
         similarity_score = cosine_similarity(images_vectors)
         return similarity_score
 
-    def generate_images_matrix_similarity(self):
-        path = Path('/home/kvydyk/Documents/projects/copygram/backend/media/posts/')
-        images = [str(file_path) for file_path in path.rglob('*.jpg')]
-        df_cells = [image.split('/')[-1].split('.')[0] for image in images]
-    
-        res = self.compare_images(images)
-        cos_similarities_df = pd.DataFrame(res, columns=df_cells, index=df_cells)
-        cos_similarities_df.to_hdf('media/images_similarities.h5', key='data')
+    def generate_images_matrix_similarity(self, root: str = 'media/posts'):
+        """
+        Store the `SIMILAR_IMAGES` nearest images of every image,
+        as (image, neighbor, score) rows, instead of the full matrix.
+        """
+
+        images = [str(file_path) for file_path in Path(root).rglob('*.jpg')]
+        with decoding_pool() as executor:
+            self.store_images_embeddings(images, IMAGES_EMBEDDINGS_PATH, executor)
+
+        embeddings = pd.read_hdf(IMAGES_EMBEDDINGS_PATH, 'embeddings')
+        names = embeddings.index.to_numpy()
+        with pd.HDFStore(IMAGES_SIMILARITIES_PATH, mode='w') as store:
+            for start, best, scores in iter_top_similarities(embeddings.to_numpy()):
+                store.append('data', pd.DataFrame({
+                    'image': np.repeat(names[start:start + len(best)], best.shape[1]),
+                    'neighbor': names[best.ravel()],
+                    'score': scores.ravel(),
+                }), data_columns=['image'], min_itemsize={'image': 64, 'neighbor': 64})
 
     @staticmethod
     def compare_descriptions(first: str, second: str):
@@ -73,23 +212,16 @@ class Recognizer:
 
         return similarity_score
 
+    @staticmethod
     def generate_descriptions_embeddings(descrs: list[str]):
-        unique_words = set()
-        for description in descrs:
-            unique_words |= set(description.lower().split())
-        unique_words = list(unique_words)
-        
-        word_embeddings = []
-        for description in descrs:
-            df = pd.DataFrame(0, index=[description], columns=unique_words)
-            words = description.lower().split()
-            for word in words:
-                df.at[description, word] = 1
-            
-            word_embeddings.append(df.loc[description].values)  # Save the vector for this description
-
-        # Stack all the description vectors into one numpy array
-        return np.vstack(word_embeddings)
+        """Binary bag-of-words vectors, one row per description."""
+        vectorizer = CountVectorizer(
+            binary=True,
+            lowercase=True,
+            tokenizer=str.split,
+            token_pattern=None,
+        )
+        return vectorizer.fit_transform(descrs).toarray()
 
 
 if __name__ == '__main__':
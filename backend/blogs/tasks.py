@@ -1,14 +1,31 @@
 import json
+import logging
+import numpy as np
 import pandas as pd
 
+from collections import defaultdict
 from datetime import timedelta
 from celery import shared_task
 from celery.result import allow_join_result
+from django.core.files.storage import default_storage
 from django_celery_beat.models import PeriodicTask, CrontabSchedule
+from sklearn.metrics.pairwise import cosine_similarity
 
 from common import redis_client
-from blogs.models import Story
-from blogs.similarities import Recognizer
+from blogs import explore, ranking, timelines, trending
+from blogs.models import MediaBlob, Post, PostMedia, Story
+from blogs.embeddings import EMBED_TIMEOUT, get_embedding_batcher
+from blogs.hashing import MultiIndexHash
+from blogs.lsh import DescriptionIndex
+from blogs.similarities import (
+    IMAGES_EMBEDDINGS_PATH,
+    IMAGES_SIMILARITIES_PATH,
+    Recognizer,
+)
+from users.vip import remove_expired_vips
+
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
@@ -39,6 +56,125 @@ def archive_story_scheduler(story_id, story_date):
     )
 
 
+@shared_task
+def process_post_media(media_ids: list[int]):
+    """
+    Resize and re-encode uploaded post images.
+    The original file is removed once the processed one is stored.
+    """
+
+    media = list(PostMedia.objects.filter(id__in=media_ids, is_ready=False))
+    originals = [obj.file.name for obj in media]
+
+    # identical uploads reuse already processed files
+    pending = [obj for obj in media if not obj.reuse_blob()]
+    PostMedia.process_many(pending)
+    for obj in pending:
+        obj.register_blob()
+
+    for obj, original in zip(media, originals):
+        obj.is_ready = True
+        obj.save(
+            update_fields=[
+                'file',
+                'blob',
+                'is_ready',
+                *MediaBlob.shared_fields,
+            ],
+        )
+        if obj.file.name != original:
+            obj.file.storage.delete(original)
+
+
+@shared_task
+def process_story(story_id: int):
+    """Generate story renditions and remove the original upload."""
+    story = Story.objects.filter(id=story_id, is_ready=False).first()
+    if story is None:
+        return
+
+    original = story.img.name
+    try:
+        story.process_image()
+    except OSError:
+        logger.exception('Could not process story %s', story_id)
+    story.is_ready = True
+    story.save(update_fields=['img', 'renditions', 'stem', 'is_ready'])
+    if story.img.name != original:
+        story.img.storage.delete(original)
+
+
+@shared_task
+def fan_out_post(post_id: int):
+    """Push a new post to the home timelines of the owner followers."""
+    post = Post.objects.filter(id=post_id, archived=False).first()
+    if post is not None:
+        timelines.fan_out(post)
+
+
+@shared_task
+def retract_post(post_id: int, owner_id: int):
+    timelines.retract(post_id, owner_id)
+
+
+@shared_task
+def refresh_explore_pool():
+    """Reshuffle the explore pool, sessions keep paging the previous one."""
+    explore.build_pool()
+
+
+@shared_task
+def refresh_vip_pool():
+    """Drop ended VIP statuses and rebuild the boosted explore posts."""
+    remove_expired_vips()
+    explore.build_vip_pool()
+
+
+@shared_task
+def refresh_trending():
+    """Merge the interaction buckets into the decayed trending rankings."""
+    trending.refresh()
+
+
+@shared_task
+def rank_active_feeds():
+    """Score the feeds of the users that read them, in batches."""
+    batch = []
+    for user_id in ranking.active_users():
+        batch.append(user_id)
+        if len(batch) == ranking.RANKING_BATCH:
+            ranking.rank_feeds(batch)
+            batch = []
+    if batch:
+        ranking.rank_feeds(batch)
+
+
+@shared_task(queue='embeddings')
+def generate_images_embeddings(images: list[str]) -> list[list[float]]:
+    """
+    Embed images on the dedicated worker.
+    The worker keeps the model loaded and batches concurrent calls.
+    """
+
+    return get_embedding_batcher().embed(images).tolist()
+
+
+def image_name(file: str) -> str:
+    return file.split('/')[-1].split('.')[0]
+
+
+def embed_images(files: list[str]) -> dict[str, np.ndarray]:
+    """Embeddings of the images by name, computed on the dedicated worker."""
+    paths = [default_storage.path(file.removeprefix('/media/')) for file in files]
+    result = generate_images_embeddings.delay(paths)
+    with allow_join_result():
+        embeddings = result.get(timeout=EMBED_TIMEOUT)
+    return {
+        image_name(file): np.array(embedding)
+        for file, embedding in zip(files, embeddings)
+    }
+
+
 @shared_task
 def remove_similar_posts(username: str, data: list[dict], posts: list[dict]):
     exclude = update_posts_recommendations.delay(data, posts)
@@ -52,29 +188,73 @@ def remove_similar_posts(username: str, data: list[dict], posts: list[dict]):
 def update_posts_recommendations(uninteresting: list[dict], others: list[dict]):
     """Find similar posts, based on images and descriptions."""
 
-    posts = []
-    image_data = pd.read_hdf('media/images_similarities.h5', 'data')
+    # near-duplicate images are caught by perceptual hashes,
+    # only the remaining posts are compared by embeddings and texts
+    index = MultiIndexHash()
+    for post in others:
+        if post.get('phash') is not None:
+            index.add(post['id'], post['phash'])
+
+    posts = set()
     for un in uninteresting:
-        image = un['file'].split('/')[-1].split('.')[0]
+        if un.get('phash') is not None:
+            posts |= index.search(un['phash'])
+
+    others = [post for post in others if post['id'] not in posts]
+    if not others:
+        return list(posts)
+
+    others_by_image = defaultdict(set)
+    for post in others:
+        others_by_image[image_name(post['file'])].add(post['id'])
+
+    # only the nearest images of each image are stored
+    images = [image_name(un['file']) for un in uninteresting]
+    neighbors = pd.read_hdf(
+        IMAGES_SIMILARITIES_PATH,
+        'data',
+        where=f'image in {images!r} & score > 0.75',
+    )
+    for neighbor in neighbors['neighbor']:
+        posts |= others_by_image.get(neighbor, set())
+
+    # images uploaded after the similarities were built are embedded now
+    with pd.HDFStore(IMAGES_EMBEDDINGS_PATH, mode='r') as store:
+        stored = set(store.select_column('embeddings', 'index'))
+    missing = [post['file'] for post in others if image_name(post['file']) not in stored]
+    embeddings = {}
+    if missing:
+        embeddings = embed_images([un['file'] for un in uninteresting] + missing)
+
+    others_by_id = {post['id']: post for post in others}
+    descriptions_index = DescriptionIndex()
+    for un, image in zip(uninteresting, images):
+        for another_file in missing:
+            another_image = image_name(another_file)
+            sim_images = cosine_similarity(
+                embeddings[image].reshape(1, -1),
+                embeddings[another_image].reshape(1, -1),
+            )[0][0]
+            if sim_images > 0.75:
+                posts |= others_by_image[another_image]
+
+        # only posts sharing an LSH band bucket can have a similar description
         description = un['description']
-        for post in others:
-            another_image = post['file'].split('/')[-1].split('.')[0]
-            another_description = post['description']
-
-            # get similarity between images
-            try:
-                sim_images = image_data.at[image, another_image]
-            except KeyError:
-                sim_images = 0
-
-            if description and another_description:
-                sim_texts = Recognizer.compare_descriptions(
-                    description,
-                    another_description,
-                )
-            else:
-                sim_texts = 0
-
-            if sim_images > 0.75 or sim_texts > 0.75:
-                posts.append(post['id'])
-    return posts
+        if not description:
+            continue
+        if un.get('id') is None:
+            candidates = descriptions_index.query(description)
+        else:
+            candidates = descriptions_index.query_post(un['id'])
+        candidates &= others_by_id.keys()
+        for post_id in candidates - posts:
+            another_description = others_by_id[post_id]['description']
+            if not another_description:
+                continue
+            sim_texts = Recognizer.compare_descriptions(
+                description,
+                another_description,
+            )
+            if sim_texts > 0.75:
+                posts.add(post_id)
+    return list(posts)
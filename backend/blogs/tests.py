@@ -1,5 +1,13 @@
+import zlib
+import numpy as np
+import pandas as pd
+
+from io import BytesIO
 from unittest.mock import patch
-from django.test import TestCase, override_settings
+from PIL import Image, ImageDraw
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.conf import settings
 from django.urls import reverse
 from django.core.files.base import ContentFile
@@ -7,7 +15,42 @@ from taggit.models import Tag
 from faker import Faker
 
 from users.models import Follower, User
-from blogs.models import Comment, Post, PostMedia, Story, UninterestingPost
+from users.vip import VIP_USERS_KEY, activate_vip, is_vip
+from blogs.embeddings import EmbeddingBatcher
+from blogs.hashing import MultiIndexHash, dhash, hamming_distance, to_signed
+from blogs import lsh
+from blogs.lsh import DescriptionIndex
+from blogs.similarities import iter_top_similarities
+from blogs.models import (
+    Comment,
+    MediaBlob,
+    Post,
+    PostMedia,
+    Story,
+    UninterestingPost,
+)
+from blogs.tasks import (
+    fan_out_post,
+    process_post_media,
+    process_story,
+    retract_post,
+    update_posts_recommendations,
+)
+from blogs.explore import (
+    CURRENT_POOL_KEY, VIP_POOL_KEY, FilteredExplore, build_pool, build_vip_pool,
+)
+from blogs.ranking import active_users, rank_feeds
+from blogs import timelines, trending
+from blogs.utils import get_explore_pool, get_explore_posts, get_feed_posts
+from blogs.viewer import with_viewer_state
+from common.images import (
+    RENDITIONS, downscale_upload, make_placeholder, make_renditions, open_image,
+)
+from common.cache import user_scope, version_key
+from common.db import in_order
+from common.pagination import decode_cursor, encode_cursor, paginate_keyset
+from common.views import story_owners
+from common.utils import redis_client
 
 # TODO: Rewrite the tests using pytest
 
@@ -66,6 +109,238 @@ class PostTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.context_data['posts']), 1)
 
+    @patch('users.signals.recommend_users', return_value=None)
+    def test_cached_feed(self, mock_recommendations):
+        User.objects.filter(id=self.user.id).update(is_active=True)
+        Follower.objects.create(from_user=self.user, to_user=self.another_user)
+        # the test users get the same ids on every run
+        redis_client.incr(version_key(user_scope(self.user.id)))
+
+        url = reverse('post-feed')
+        response = self.client.get(url)
+        self.assertFalse(response.data['results'][0]['is_liked'])
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url)
+        self.assertEqual(cached.data, response.data)
+        self.assertFalse(any('blogs_post' in query['sql'] for query in queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-add-like', args=[self.another_post.id]))
+        response = self.client.get(url)
+        self.assertTrue(response.data['results'][0]['is_liked'])
+
+    @patch('users.signals.recommend_users', return_value=None)
+    def test_fan_out_post(self, mock_recommendations):
+        Follower.objects.create(from_user=self.user, to_user=self.another_user)
+        timeline = get_feed_posts(self.user.id)
+        self.assertEqual(timeline[:], [self.another_post])
+
+        # new posts are pushed in background
+        post = Post.objects.create(description='New', owner=self.another_user)
+        fan_out_post(post.id)
+        self.assertEqual(timeline[:], [post, self.another_post])
+
+        retract_post(post.id, self.another_user.id)
+        self.assertEqual(len(timeline), 1)
+
+    @patch('users.signals.recommend_users', return_value=None)
+    def test_empty_timeline(self, mock_recommendations):
+        timelines.invalidate(self.user.id)
+        self.assertEqual(get_feed_posts(self.user.id)[:], [])
+        self.assertGreater(redis_client.ttl(timelines.empty_key(self.user.id)), 0)
+        self.assertIn(self.user.id, active_users())
+        # the empty timeline is not built again
+        with self.assertNumQueries(0):
+            self.assertEqual(get_feed_posts(self.user.id)[:], [])
+
+        Follower.objects.create(from_user=self.user, to_user=self.another_user)
+        timelines.Timeline(self.user.id).load()
+        post = Post.objects.create(description='New', owner=self.another_user)
+        fan_out_post(post.id)
+        self.assertEqual(get_feed_posts(self.user.id)[:], [post, self.another_post])
+        self.assertFalse(redis_client.exists(timelines.empty_key(self.user.id)))
+
+    @patch('users.signals.recommend_users', return_value=None)
+    def test_keyset_pagination(self, mock_recommendations):
+        Follower.objects.create(from_user=self.user, to_user=self.another_user)
+        posts = [
+            Post.objects.create(description=str(i), owner=self.another_user)
+            for i in range(4)
+        ]
+        for post in posts:
+            fan_out_post(post.id)
+
+        def read_pages(queryset):
+            pages, cursor = [], None
+            while True:
+                page, cursor = paginate_keyset(queryset, cursor, 2)
+                pages.extend(page)
+                if cursor is None:
+                    return pages
+
+        expected = Post.objects.order_by('-created_at', '-id')
+        self.assertEqual(read_pages(Post.objects.all()), list(expected))
+        self.assertEqual(
+            read_pages(get_feed_posts(self.user.id)),
+            list(expected.filter(owner=self.another_user)),
+        )
+
+        response = self.client.get(reverse('blogs:feed'), {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+
+    @patch('users.signals.recommend_users', return_value=None)
+    def test_rank_feeds(self, mock_recommendations):
+        Follower.objects.create(from_user=self.user, to_user=self.another_user)
+        newest = Post.objects.create(description='New', owner=self.another_user)
+        get_feed_posts(self.user.id)
+        self.assertEqual(get_feed_posts(self.user.id, ranked=True)[:], [
+            newest,
+            self.another_post,
+        ])
+
+        # the liked post comes first, from the same author
+        self.another_post.like(self.user)
+        self.assertEqual(rank_feeds([self.user.id]), 1)
+        self.assertEqual(get_feed_posts(self.user.id, ranked=True)[:], [
+            self.another_post,
+            newest,
+        ])
+
+    def test_explore_pool(self):
+        for i in range(3):
+            Post.objects.create(description=str(i), owner=self.another_user)
+        pool = build_pool()
+        # the pointer never outlives the pool it names
+        self.assertLess(redis_client.ttl(CURRENT_POOL_KEY), redis_client.ttl(pool))
+
+        def read_pages(seed, refresh=False):
+            pages, cursor = [], None
+            while True:
+                page, cursor = paginate_keyset(get_explore_pool(seed=seed), cursor, 2)
+                pages.extend(page)
+                if refresh:
+                    build_pool()
+                if cursor is None:
+                    return pages
+
+        posts = read_pages(0.5)
+        self.assertCountEqual(posts, Post.objects.all())
+        self.assertEqual(read_pages(0.5), posts)
+        # the pool is reshuffled between pages, the cursor keeps its version
+        self.assertCountEqual(read_pages(0.5, refresh=True), posts)
+
+        # an expired version is read again from the current one
+        page, cursor = paginate_keyset(get_explore_pool(seed=0.5), None, 1)
+        redis_client.delete(decode_cursor(cursor)[0])
+        build_pool()
+        page, cursor = paginate_keyset(get_explore_pool(seed=0.5), cursor, 1)
+        self.assertEqual(len(page), 1)
+
+    def test_in_order(self):
+        ids = [self.another_post.id, 0, self.post.id]
+        self.assertEqual(
+            in_order(Post.objects.all(), ids),
+            [self.another_post, self.post],
+        )
+        self.assertEqual(Post.objects.filter(id__any=set(ids)).count(), 2)
+
+    def test_viewer_state(self):
+        self.another_post.like(self.user)
+        self.another_post.saved.add(self.user)
+        UninterestingPost.objects.create(user=self.user, post=self.post)
+        Follower.objects.create(from_user=self.user, to_user=self.another_user)
+
+        posts = [self.post, self.another_post]
+        with self.assertNumQueries(1):
+            post, another_post = with_viewer_state(self.user, posts)
+        self.assertEqual(
+            [post.is_liked, post.is_saved, post.is_uninteresting, post.follows_owner],
+            [False, False, True, False],
+        )
+        self.assertEqual(
+            [
+                another_post.is_liked,
+                another_post.is_saved,
+                another_post.is_uninteresting,
+                another_post.follows_owner,
+            ],
+            [True, True, False, True],
+        )
+
+    @patch('blogs.trending.current_bucket', return_value=0)
+    def test_trending(self, mock_bucket):
+        keys = [
+            trending.bucket_key(0),
+            trending.bucket_key(0, self.tag.name),
+            trending.bucket_key(-trending.HALF_LIFE),
+            trending.tags_key(0),
+            trending.rank_key(),
+            trending.rank_key(self.tag.name),
+        ]
+        self.addCleanup(redis_client.delete, *keys)
+
+        trending.record_post(self.post, 'view')
+        trending.record_post(self.post, 'view')
+        trending.record_post(self.another_post, 'like')
+        trending.refresh()
+        self.assertEqual(
+            trending.get_trending_ids(limit=2),
+            [self.another_post.id, self.post.id],
+        )
+        self.assertEqual(trending.get_trending_ids(self.tag.name), [self.post.id])
+
+        # older interactions weigh less
+        redis_client.zincrby(trending.bucket_key(-trending.HALF_LIFE), 5, self.post.id)
+        trending.merge()
+        self.assertEqual(redis_client.zscore(trending.POST_RANK_KEY, self.post.id), 4.5)
+
+        response = self.client.get(reverse('post-trending'), {'tag': self.tag.name})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+        post_id = self.post.id
+        self.post.delete()
+        self.assertEqual(trending.get_trending_ids(), [self.another_post.id])
+        self.assertEqual(trending.get_trending_ids(self.tag.name), [])
+        self.assertIsNone(redis_client.zscore(trending.bucket_key(0, self.tag.name), post_id))
+
+    def test_vip_pool(self):
+        self.addCleanup(redis_client.delete, VIP_USERS_KEY, VIP_POOL_KEY)
+        activate_vip(self.another_user.id, 10)
+        self.assertTrue(is_vip(self.another_user.id))
+        self.assertFalse(is_vip(self.user.id))
+
+        build_vip_pool()
+        build_pool()
+        posts, cursor = paginate_keyset(get_explore_pool(seed=0.5), None, 1)
+        self.assertEqual(posts, [self.another_post])
+        posts, cursor = paginate_keyset(get_explore_pool(), cursor, 10)
+        self.assertEqual(posts, [self.post])
+
+    def test_filtered_explore(self):
+        self.addCleanup(redis_client.delete, VIP_USERS_KEY, VIP_POOL_KEY)
+        newer = Post.objects.create(description='Newer', owner=self.user)
+        activate_vip(self.another_user.id, 10)
+        build_vip_pool()
+
+        posts = FilteredExplore(get_explore_posts())
+        page, cursor = paginate_keyset(posts, None, 1)
+        self.assertEqual(page, [self.another_post])
+        page, cursor = paginate_keyset(posts, cursor, 1)
+        self.assertEqual(page, [newer])
+        page, cursor = paginate_keyset(posts, cursor, 10)
+        self.assertEqual(page, [self.post])
+        self.assertIsNone(cursor)
+
+        for position in ([0], [0, 'yesterday', 1], [2, '2024-01-01T00:00:00', 1]):
+            with self.assertRaises(ValueError):
+                paginate_keyset(posts, encode_cursor(position), 1)
+
+        self.client.logout()
+        response = self.client.get(reverse('blogs:explore'), {'owner__username__icontains': 'j'})
+        self.assertEqual(list(response.context_data['posts']), [self.another_post])
+
     def test_get_explore(self):
         response = self.client.get(reverse('blogs:explore'))
         self.assertEqual(response.status_code, 200)
@@ -82,10 +357,33 @@ class PostTestCase(TestCase):
         file2 = ContentFile(image, name=file_name)
 
         data = {'description': 'Test description', 'files': [file1, file2]}
-        response = self.client.post(url, data)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(url, data)
 
         self.assertEqual(response.status_code, 302)
         self.assertEqual(self.user.posts.count(), 2)
+        # media processing and timelines fan-out, then the cache versions
+        tasks = [callback for callback in callbacks if callback.__name__ != 'increment']
+        self.assertEqual(len(tasks), 2)
+
+        # images are processed in background
+        post = self.user.posts.latest('id')
+        self.assertFalse(post.files.filter(is_ready=True).exists())
+
+        process_post_media(list(post.files.values_list('id', flat=True)))
+        for media in post.files.all():
+            self.assertTrue(media.is_ready)
+            thumbnail = media.renditions['thumbnail']
+            with media.file.storage.open(thumbnail['jpeg']) as file:
+                self.assertEqual(Image.open(file).size, (350, 225))
+            self.assertTrue(thumbnail['webp'].endswith('.webp'))
+            self.assertIsNotNone(media.width)
+            self.assertEqual(media.sizes['thumbnail'], {'width': 350, 'height': 225})
+            self.assertTrue(media.placeholder.startswith('data:image/webp;base64,'))
+
+        # grids render the thumbnail, so they get its size
+        post = Post.objects.with_files().get(id=post.id)
+        self.assertEqual((post.width, post.height), (350, 225))
 
     def test_get_post(self):
         response = self.client.get(reverse('blogs:post', args=[self.post.id]))
@@ -115,9 +413,26 @@ class PostTestCase(TestCase):
         response = self.client.post(url)
         self.assertEqual(response.json()['status'], 'Liked')
 
+        p.refresh_from_db()
+        self.assertEqual(p.likes_count, 1)
+
         url = reverse('blogs:remove_like', args=[p.id])
         response = self.client.delete(url)
         self.assertEqual(response.json()['status'], 'Unliked')
+        p.refresh_from_db()
+        self.assertEqual(p.likes_count, 0)
+
+    def test_sync_counters(self):
+        post = Post.objects.get(id=self.post.id)
+        self.assertEqual(post.cover, post.files.first())
+
+        # likes added without counting them
+        Post.likes.through.objects.create(post=post, user=self.another_user)
+        Post.objects.filter(id=post.id).update(cover=None)
+        self.assertEqual(Post.objects.sync_counters(), 2)
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+        self.assertEqual(post.cover, post.files.first())
 
     def test_save_post(self):
         url = reverse('blogs:save_post', args=[self.another_post.id])
@@ -149,6 +464,140 @@ class PostTestCase(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertEqual(self.user.posts.filter(archived=True).count(), 0)
 
+    def test_similar_descriptions(self):
+        index = DescriptionIndex()
+        self.assertIn(self.post.id, index.query('Test description'))
+        self.assertIn(self.another_post.id, index.query_post(self.post.id))
+
+        self.post.description = 'Something else entirely'
+        self.post.save()
+        self.assertNotIn(self.post.id, index.query('Test description'))
+
+    @patch('blogs.tasks.pd.HDFStore')
+    @patch('blogs.tasks.pd.read_hdf')
+    def test_update_posts_recommendations(self, mock_read_hdf, mock_store):
+        description = 'a long enough description of a mountain lake at sunrise'
+        posts = []
+        for shape in ('rectangle', 'ellipse'):
+            image = Image.new('RGB', (200, 200), 'white')
+            getattr(ImageDraw.Draw(image), shape)((20, 20, 120, 180), fill='black')
+            buffer = BytesIO()
+            image.save(buffer, format='JPEG')
+            post = Post.objects.create(description=description, owner=self.another_user)
+            PostMedia.objects.create(file=ContentFile(buffer.getvalue(), name='a.jpg'), post=post)
+            posts.append(post)
+
+        # shaped like the querysets of the recommender
+        def values(post, *fields):
+            return list(
+                Post.objects.annotated().
+                filter(id=post.id).
+                with_phash().
+                values(*fields)
+            )
+
+        others = values(posts[1], 'id', 'description', 'file', 'phash')
+        uninteresting = values(posts[0], 'id', 'description', 'file', 'phash')
+
+        # no stored image neighbors, every image was embedded already
+        mock_read_hdf.return_value = pd.DataFrame(columns=['image', 'neighbor', 'score'])
+        store = mock_store.return_value.__enter__.return_value
+        store.select_column.return_value = [
+            post['file'].split('/')[-1].split('.')[0] for post in others + uninteresting
+        ]
+        self.assertEqual(update_posts_recommendations(uninteresting, others), [posts[1].id])
+        # without ids, the description itself is looked up
+        uninteresting = values(posts[0], 'description', 'file', 'phash')
+        self.assertEqual(update_posts_recommendations(uninteresting, others), [posts[1].id])
+
+    def test_minhash(self):
+        text = 'a long enough description of a post'
+        # the same permutations in exact integer arithmetic
+        hashes = [zlib.crc32(token.encode()) % lsh.PRIME for token in lsh.tokenize(text)]
+        expected = [
+            min((int(a) * value + int(b)) % lsh.PRIME for value in hashes)
+            for a, b in zip(lsh._a, lsh._b)
+        ]
+        self.assertEqual(lsh.minhash(text).tolist(), expected)
+
+    def test_deduplicate_media(self):
+        media = self.post.files.get()
+        another_media = self.another_post.files.get()
+        # both posts were created from the same bytes
+        self.assertEqual(media.blob, another_media.blob)
+        self.assertEqual(media.file.name, another_media.file.name)
+        self.assertEqual(media.blob.ref_count, 2)
+
+        storage = media.file.storage
+        paths = media.blob.get_paths()
+        blob = media.blob
+        with self.captureOnCommitCallbacks(execute=True):
+            media.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            another_media.delete()
+        self.assertFalse(MediaBlob.objects.filter(id=blob.id).exists())
+        self.assertFalse(any(storage.exists(path) for path in paths))
+
+    def test_store_existing_renditions(self):
+        # processed at the same time, before either registered a blob
+        image = self.faker.image()
+        media = [
+            PostMedia(file=ContentFile(image, name='a.jpg'), post=self.post)
+            for _ in range(2)
+        ]
+        for obj in media:
+            obj.process_image()
+
+        self.assertEqual(media[0].renditions, media[1].renditions)
+        self.assertEqual(media[0].file.name, f'posts/{media[0].digest[:2]}/{media[0].digest}.jpg')
+
+    @patch('blogs.tasks.process_post_media.delay')
+    def test_deduplicate_before_write(self, mock_process):
+        image = self.faker.image()
+        post = Post.objects.create(owner=self.user)
+        media = PostMedia.objects.create(file=ContentFile(image, name='first.jpg'), post=post)
+        file = ContentFile(image, name='copy.jpg')
+
+        with (
+            patch.object(media.file.storage, 'save') as mock_save,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            [copy] = PostMedia.bulk_create_with_processing([PostMedia(file=file, post=post)])
+
+        mock_save.assert_not_called()
+        mock_process.assert_not_called()
+        self.assertTrue(copy.is_ready)
+        self.assertEqual(copy.file.name, media.file.name)
+        self.assertEqual(copy.blob_id, media.blob_id)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=True)
+    def test_serve_media(self):
+        media = self.post.files.get()
+        url = reverse('media', args=[media.file.name])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            f'/protected/{media.file.name}',
+        )
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+
+        for user in (self.user, self.another_user):
+            user.privacy.private_account = True
+            user.privacy.save()
+
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+
+        self.client.logout()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+
     def test_get_archived_posts(self):
         self.post.archived = True
         self.post.save()
@@ -245,12 +694,136 @@ class StoryTestCase(TestCase):
         image = self.faker.image()
         file = ContentFile(image, name=file_name)
 
-        response = self.client.post(reverse('blogs:create_story'), {'img': file})
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse('blogs:create_story'), {'img': file})
         self.assertEqual(response.status_code, 302)
         self.assertEqual(self.user.stories.count(), 2)
+        # processing, then the cache versions
+        tasks = [callback for callback in callbacks if callback.__name__ != 'increment']
+        self.assertEqual(len(tasks), 1)
+
+        # story images are processed in background
+        story = self.user.stories.latest('id')
+        self.assertFalse(story.is_ready)
+
+        process_story(story.id)
+        story.refresh_from_db()
+        self.assertTrue(story.is_ready)
+        with story.img.storage.open(story.renditions['thumbnail']['jpeg']) as f:
+            self.assertEqual(Image.open(f).size, (270, 480))
+        self.assertTrue(story.thumbnail_url.endswith('.jpg'))
+        # access to every rendition is resolved by the indexed stem
+        for formats in story.renditions.values():
+            for path in formats.values():
+                self.assertEqual(story_owners(path), {self.user.id})
 
     def test_delete_story(self):
         url = reverse('blogs:delete_story', args=[self.story.id])
         response = self.client.delete(url)
         self.assertEqual(response.status_code, 302)
         self.assertEqual(self.user.stories.count(), 0)
+
+
+class PerceptualHashTestCase(SimpleTestCase):
+
+    @staticmethod
+    def create_image(offset=0):
+        img = Image.new('RGB', (350, 225), 'white')
+        draw = ImageDraw.Draw(img)
+        draw.rectangle((40 + offset, 40, 200 + offset, 180), fill='black')
+        draw.ellipse((220, 60, 320, 160), fill='gray')
+        return img
+
+    def test_near_duplicates(self):
+        original = dhash(self.create_image())
+        shifted = dhash(self.create_image(offset=2))
+        different = dhash(self.create_image().rotate(90))
+
+        self.assertLessEqual(hamming_distance(original, shifted), 7)
+        self.assertGreater(hamming_distance(original, different), 7)
+
+    def test_index_search(self):
+        index = MultiIndexHash(max_distance=7)
+        original = to_signed(dhash(self.create_image()))
+        index.add(1, original)
+        index.add(2, to_signed(dhash(self.create_image(offset=2))))
+        index.add(3, to_signed(dhash(self.create_image().rotate(90))))
+
+        self.assertEqual(index.search(original), {1, 2})
+
+
+class EmbeddingBatcherTestCase(SimpleTestCase):
+
+    def test_model_load_failure(self):
+        class BrokenRecognizer:
+            def __init__(self):
+                raise OSError('Missing weights')
+
+        batcher = EmbeddingBatcher(BrokenRecognizer)
+        future = batcher.submit(np.zeros((1, 4, 4, 3), dtype=np.float32))
+        with self.assertRaises(OSError):
+            future.result(timeout=5)
+
+
+class TopSimilaritiesTestCase(SimpleTestCase):
+
+    def test_chunks_match_full_matrix(self):
+        embeddings = np.random.default_rng(0).random((10, 8))
+        normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        scores = normalized @ normalized.T
+        np.fill_diagonal(scores, -np.inf)
+
+        rows = {}
+        for start, indexes, best_scores in iter_top_similarities(embeddings, k=3, chunk_size=4):
+            for offset, (row, row_scores) in enumerate(zip(indexes, best_scores)):
+                rows[start + offset] = row
+                np.testing.assert_allclose(row_scores, scores[start + offset][row])
+
+        self.assertEqual(len(rows), 10)
+        for image, row in rows.items():
+            self.assertEqual(list(row), list(np.argsort(-scores[image])[:3]))
+
+    def test_k_larger_than_images(self):
+        chunks = list(iter_top_similarities(np.eye(3), k=50))
+        self.assertEqual(chunks[0][1].shape, (3, 2))
+
+
+class ImageProcessingTestCase(SimpleTestCase):
+
+    @staticmethod
+    def create_jpeg(size):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'gray').save(buffer, format='JPEG')
+        buffer.seek(0)
+        return buffer
+
+    def test_draft_decode(self):
+        img = open_image(self.create_jpeg((4000, 3000)), box=(350, 225))
+        # decoded at 1/8 scale, still large enough for the thumbnail
+        self.assertEqual(img.size, (500, 375))
+
+        img = open_image(self.create_jpeg((4000, 3000)))
+        self.assertEqual(img.size, (4000, 3000))
+
+        # 1/2 scale is close enough to the full rendition box
+        img = open_image(self.create_jpeg((4000, 3000)), RENDITIONS['full'])
+        self.assertEqual(img.size, (2000, 1500))
+
+    def test_renditions(self):
+        img = open_image(self.create_jpeg((4000, 3000)), RENDITIONS['full'])
+        renditions = make_renditions(img)
+        self.assertEqual(renditions['full'].size, (2000, 1500))
+        self.assertEqual(renditions['medium'].size, (1080, 810))
+        self.assertEqual(renditions['thumbnail'].size, (350, 225))
+
+    def test_placeholder(self):
+        img = open_image(self.create_jpeg((4000, 3000)), RENDITIONS['full'])
+        placeholder = make_placeholder(img)
+        self.assertTrue(placeholder.startswith('data:image/webp;base64,'))
+        self.assertLess(len(placeholder), 255)
+
+    def test_downscale_upload(self):
+        self.assertIsNone(downscale_upload(self.create_jpeg((800, 600)), (1280, 1280)))
+
+        content = downscale_upload(self.create_jpeg((4000, 3000)), (1280, 1280))
+        self.assertEqual(Image.open(content).size, (1280, 960))
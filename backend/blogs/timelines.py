@@ -0,0 +1,226 @@
+import time
+
+from datetime import UTC, datetime
+
+from blogs.models import Post
+from common.cache import user_scope, version_key
+from common.db import in_order
+from common.utils import redis_client
+from users.models import Follower
+
+
+# posts kept per timeline, older pages are not served from the feed
+TIMELINE_SIZE = 800
+# timelines of inactive users expire and are not written to anymore
+TIMELINE_TTL = 60 * 60 * 24 * 7
+# authors with more followers are merged into timelines on read
+FANOUT_LIMIT = 10_000
+FANOUT_BATCH = 1000
+
+PULL_AUTHORS_KEY = 'timeline:pull_authors'
+# users scored by the time they last read their feed
+ACTIVE_USERS_KEY = 'timeline:active_users'
+
+
+def timeline_key(user_id: int) -> str:
+    return f'timeline:{user_id}'
+
+
+def empty_key(user_id: int) -> str:
+    """Set instead of the timeline when it was built without posts."""
+    return f'timeline:{user_id}:empty'
+
+
+def ranked_key(user_id: int) -> str:
+    """The timeline ranked by `blogs.ranking`."""
+    return f'feed:ranked:{user_id}'
+
+
+def fan_out(post: Post):
+    """
+    Push a new post to the timelines of the owner followers.
+
+    Only timelines that currently exist, or were built empty, are written,
+    a missing one is built from the database on the next read anyway.
+    Posts of authors with many followers are not pushed at all.
+    """
+
+    followers = Follower.objects.filter(to_user_id=post.owner_id)
+    if followers.count() > FANOUT_LIMIT:
+        redis_client.sadd(PULL_AUTHORS_KEY, post.owner_id)
+        return
+    redis_client.srem(PULL_AUTHORS_KEY, post.owner_id)
+
+    score = post.created_at.timestamp()
+    ids = list(followers.values_list('from_user_id', flat=True))
+    for i in range(0, len(ids), FANOUT_BATCH):
+        batch = ids[i:i + FANOUT_BATCH]
+        with redis_client.pipeline(transaction=False) as pipeline:
+            for user_id in batch:
+                pipeline.exists(timeline_key(user_id))
+                pipeline.exists(empty_key(user_id))
+            results = pipeline.execute()
+        existing = [
+            (user_id, empty)
+            for user_id, exists, empty in zip(batch, results[::2], results[1::2])
+            if exists or empty
+        ]
+
+        with redis_client.pipeline(transaction=False) as pipeline:
+            for user_id, empty in existing:
+                key = timeline_key(user_id)
+                pipeline.zadd(key, {post.id: score})
+                pipeline.zremrangebyrank(key, 0, -TIMELINE_SIZE - 1)
+                if empty:
+                    # the timeline is created by the first post
+                    pipeline.expire(key, TIMELINE_TTL)
+                    pipeline.delete(empty_key(user_id))
+                # the cached feed pages of the follower are outdated
+                pipeline.incr(version_key(user_scope(user_id)))
+            pipeline.execute()
+
+
+def retract(post_id: int, owner_id: int):
+    """Remove a deleted or archived post from the followers timelines."""
+    ids = list(
+        Follower.objects.
+        filter(to_user_id=owner_id).
+        values_list('from_user_id', flat=True)
+    )
+    for i in range(0, len(ids), FANOUT_BATCH):
+        with redis_client.pipeline(transaction=False) as pipeline:
+            for user_id in ids[i:i + FANOUT_BATCH]:
+                pipeline.zrem(timeline_key(user_id), post_id)
+                pipeline.incr(version_key(user_scope(user_id)))
+            pipeline.execute()
+
+
+def invalidate(user_id: int):
+    """Drop the timelines after the user follows or unfollows someone."""
+    redis_client.delete(
+        timeline_key(user_id),
+        empty_key(user_id),
+        ranked_key(user_id),
+    )
+
+
+def mark_active(user_id: int):
+    """Record a feed read, see `blogs.ranking.active_users`."""
+    redis_client.zadd(ACTIVE_USERS_KEY, {user_id: time.time()})
+
+
+class Timeline:
+    """
+    Home feed of a user: ids of the followed accounts posts,
+    in a redis sorted set scored by creation time.
+
+    The set is filled on write by `fan_out` and built from the database
+    when it is missing. It is paginated by `seek`, or sliced like
+    a queryset, and only the posts of the requested page are loaded.
+    """
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.key = timeline_key(user_id)
+
+    def load(self) -> 'Timeline':
+        # a user who follows nobody keeps an empty sentinel instead
+        if not redis_client.exists(self.key, empty_key(self.user_id)):
+            self.build()
+        else:
+            self.pull()
+        with redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.expire(self.key, TIMELINE_TTL)
+            pipeline.expire(empty_key(self.user_id), TIMELINE_TTL)
+            pipeline.execute()
+        mark_active(self.user_id)
+        return self
+
+    def add(self, posts):
+        scores = {post_id: created_at.timestamp() for post_id, created_at in posts}
+        if not scores:
+            return
+        with redis_client.pipeline(transaction=True) as pipeline:
+            pipeline.zadd(self.key, scores)
+            pipeline.zremrangebyrank(self.key, 0, -TIMELINE_SIZE - 1)
+            pipeline.delete(empty_key(self.user_id))
+            pipeline.execute()
+
+    def recent_posts(self, **filters):
+        return (
+            Post.objects.
+            filter(archived=False, **filters).
+            order_by('-created_at').
+            values_list('id', 'created_at')[:TIMELINE_SIZE]
+        )
+
+    def build(self):
+        posts = self.recent_posts(owner__followers__from_user_id=self.user_id)
+        if posts:
+            self.add(posts)
+        else:
+            redis_client.set(empty_key(self.user_id), 1, ex=TIMELINE_TTL)
+
+    def pull(self):
+        """Merge recent posts of followed authors that are not fanned out."""
+        authors = redis_client.smembers(PULL_AUTHORS_KEY)
+        if not authors:
+            return
+        followed = Follower.objects.filter(
+            from_user_id=self.user_id,
+            to_user_id__any=authors,
+        ).values('to_user_id')
+        filters = {'owner_id__in': followed}
+        if redis_client.zcard(self.key) >= TIMELINE_SIZE:
+            # the timeline is full, older posts would be trimmed right away
+            (_, oldest), = redis_client.zrange(self.key, 0, 0, withscores=True)
+            filters['created_at__gt'] = datetime.fromtimestamp(oldest, tz=UTC)
+        self.add(self.recent_posts(**filters))
+
+    def ids(self, start: int, stop: int) -> list[int]:
+        return [int(i) for i in redis_client.zrevrange(self.key, start, stop)]
+
+    def seek(self, position: list | None, limit: int) -> tuple[list[Post], list | None]:
+        """
+        Posts after `position`, the [score, id] of the last seen post,
+        and the position of the last returned one (None on the last page).
+        """
+
+        if position is None:
+            entries = redis_client.zrevrange(self.key, 0, limit, withscores=True)
+        else:
+            score, post_id = position
+            # posts with the same score follow each other, reverse-sorted by
+            # member like redis does, so ties are skipped the same way
+            ties = redis_client.zcount(self.key, score, score)
+            entries = [
+                (member, member_score)
+                for member, member_score in redis_client.zrevrangebyscore(
+                    self.key, score, '-inf',
+                    start=0, num=limit + ties + 1, withscores=True,
+                )
+                if (member_score, member) < (score, str(post_id))
+            ]
+
+        entries = entries[:limit + 1]
+        page = entries[:limit]
+        posts = self.hydrate([int(member) for member, _ in page])
+        if len(entries) <= limit:
+            return posts, None
+        member, score = page[-1]
+        return posts, [score, member]
+
+    def hydrate(self, ids: list[int]) -> list[Post]:
+        # deleted and archived posts are skipped
+        return in_order(Post.objects.annotated().prefetch_related('tags'), ids)
+
+    def __len__(self):
+        return redis_client.zcard(self.key)
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            return self.hydrate(self.ids(index, index))[0]
+        start, stop, _ = index.indices(len(self))
+        if start >= stop:
+            return []
+        return self.hydrate(self.ids(start, stop - 1))
@@ -0,0 +1,119 @@
+import time
+
+from common.db import in_order
+from common.utils import redis_client
+
+
+# interactions are counted in hourly buckets, kept for a day
+BUCKET_SIZE = 60 * 60
+BUCKETS = 24
+# the weight of a bucket halves every `HALF_LIFE` buckets
+HALF_LIFE = 6
+# seconds between merges, see the beat schedule in `copygram.celery`
+TRENDING_REFRESH = 60 * 5
+TRENDING_SIZE = 100
+
+EVENT_WEIGHTS = {
+    'view': 1,
+    'like': 3,
+    'comment': 5,
+}
+
+# merged, decayed scores, read by `get_trending_ids`
+POST_RANK_KEY = 'post_rank'
+
+
+def current_bucket() -> int:
+    return int(time.time() // BUCKET_SIZE)
+
+
+def bucket_key(bucket: int, tag: str | None = None) -> str:
+    if tag is None:
+        return f'trending:{bucket}'
+    return f'trending:tag:{tag}:{bucket}'
+
+
+def tags_key(bucket: int) -> str:
+    """Tags of the posts that had interactions during the bucket."""
+    return f'trending:tags:{bucket}'
+
+
+def rank_key(tag: str | None = None) -> str:
+    if tag is None:
+        return POST_RANK_KEY
+    return f'{POST_RANK_KEY}:tag:{tag}'
+
+
+def record(post_id: int, tags: list[str], event: str):
+    """Count an interaction with a post, globally and for each of its tags."""
+    weight = EVENT_WEIGHTS[event]
+    bucket = current_bucket()
+    keys = [bucket_key(bucket), *(bucket_key(bucket, tag) for tag in tags)]
+    # a bucket is merged for `BUCKETS` hours after it starts
+    ttl = BUCKET_SIZE * (BUCKETS + 1)
+    with redis_client.pipeline(transaction=False) as pipeline:
+        for key in keys:
+            pipeline.zincrby(key, weight, post_id)
+            pipeline.expire(key, ttl)
+        if tags:
+            pipeline.sadd(tags_key(bucket), *tags)
+            pipeline.expire(tags_key(bucket), ttl)
+        pipeline.execute()
+
+
+def record_post(post, event: str):
+    record(post.id, [tag.name for tag in post.tags.all()], event)
+
+
+def merge(tag: str | None = None, bucket: int | None = None):
+    """
+    Sum the buckets of the last day into the ranking, each weighted
+    by its age: 1 for the current bucket, 1/2 `HALF_LIFE` buckets ago.
+    Missing buckets count as empty.
+    """
+
+    bucket = current_bucket() if bucket is None else bucket
+    weights = {
+        bucket_key(bucket - age, tag): 2 ** (-age / HALF_LIFE)
+        for age in range(BUCKETS)
+    }
+    key = rank_key(tag)
+    with redis_client.pipeline(transaction=True) as pipeline:
+        pipeline.zunionstore(key, weights)
+        # only the top of the ranking is ever read
+        pipeline.zremrangebyrank(key, 0, -TRENDING_SIZE - 1)
+        # a tag nobody interacted with lately is dropped
+        pipeline.expire(key, TRENDING_REFRESH * 3)
+        pipeline.execute()
+
+
+def refresh() -> int:
+    """Merge the global ranking and the ranking of every active tag."""
+    bucket = current_bucket()
+    merge(bucket=bucket)
+    tags = redis_client.sunion([tags_key(bucket - age) for age in range(BUCKETS)])
+    for tag in tags:
+        merge(tag, bucket)
+    return len(tags)
+
+
+def forget(post_id: int, tags: list[str]):
+    """Remove a deleted post from the rankings and buckets, global and of its tags."""
+    bucket = current_bucket()
+    with redis_client.pipeline(transaction=False) as pipeline:
+        for tag in [None, *tags]:
+            pipeline.zrem(rank_key(tag), post_id)
+            for age in range(BUCKETS):
+                pipeline.zrem(bucket_key(bucket - age, tag), post_id)
+        pipeline.execute()
+
+
+def get_trending_ids(tag: str | None = None, limit: int = TRENDING_SIZE) -> list[int]:
+    """Highest ranked posts, a range read of the merged sorted set."""
+    ids = redis_client.zrevrange(rank_key(tag), 0, limit - 1)
+    return [int(post_id) for post_id in ids]
+
+
+def get_trending(queryset, tag: str | None = None, limit: int = TRENDING_SIZE) -> list:
+    # archived and deleted posts and posts of blocked users are skipped
+    return in_order(queryset, get_trending_ids(tag, limit))
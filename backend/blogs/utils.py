@@ -4,32 +4,37 @@ import google.generativeai as genai
 import google.api_core.exceptions as google_exceptions
 
 from typing_extensions import TypedDict
-from django.db import transaction, models
+from django.db import transaction
 from django.core.cache import cache
 from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
-from django.db.models.functions import Concat
 
-from common.utils import create_action, get_blocked_users, redis_client
-from blogs.models import Post, PostMedia, Story, UninterestingPost
+from common.cache import bump, get_or_set, invalidate, user_scope
+from common.utils import create_action, get_blocked_users
+from blogs import trending
+from blogs.explore import ExplorePool
+from blogs.models import Post, Story, UninterestingPost
+from blogs.ranking import RankedTimeline
+from blogs.timelines import Timeline
 from users.models import User
 from users.recommendations import Recommender
 
 
 def like_post(user: User, post: Post):
-    if post.likes.filter(id=user.id).exists():
-        status = 'Already liked'
-    else:
-        with transaction.atomic():
-            post.likes.add(user)
-            if user != post.owner:
-                create_action(user, 'liked post', post, post.file)
-        status = 'Liked'
-    return status
+    with transaction.atomic():
+        if not post.like(user):
+            return 'Already liked'
+        bump(user_scope(user.id))
+        invalidate('my_posts', user.id)
+        trending.record_post(post, 'like')
+        if user != post.owner:
+            create_action(user, 'liked post', post, post.file)
+    return 'Liked'
 
 
 def unlike_post(user: User, post: Post):
-    if post.likes.filter(id=user.id).exists():
-        post.likes.remove(user)
+    if post.unlike(user):
+        bump(user_scope(user.id))
+        invalidate('my_posts', user.id)
         status = 'Unliked'
     else:
         status = 'Post not liked'
@@ -59,83 +64,74 @@ def get_posts(user: User):
     posts = (
         Post.objects.annotated().
         exclude(owner__in=blocked_users).
-        prefetch_related('tags').
-        order_by('?')
+        prefetch_related('tags')
     )
     return posts
 
 
+def get_explore_pool(user: User | None = None, seed: float | None = None):
+    """Explore posts in the shuffled order of the session `seed`."""
+    posts = Post.objects.annotated().prefetch_related('tags')
+    if user:
+        posts = posts.exclude(owner__in=get_blocked_users(user))
+    return ExplorePool(posts, user, seed)
+
+
+def get_trending_posts(user: User | None = None, tag: str | None = None) -> list[Post]:
+    """Most engaging posts of the last day, overall or with the `tag`."""
+    posts = Post.objects.annotated().prefetch_related('tags')
+    if user:
+        posts = posts.exclude(owner__in=get_blocked_users(user))
+    return trending.get_trending(posts, tag)
+
+
 def get_explore_posts(user: User | None = None):
-    vip_users = redis_client.smembers('active_vip_users')
+    """
+    Explore posts to filter, newest first.
+    Paginate them with `FilteredExplore` to show the VIP pool first.
+    """
     posts = (
         Post.objects.annotated().
-        annotate(
-            is_vip=models.Case(
-                models.When(owner_id__in=vip_users, then=models.Value(True)),
-                default=models.Value(False),
-                output_field=models.BooleanField()
-            )
-        ).
         prefetch_related('tags').
-        order_by('-is_vip', '?')
+        order_by('-created_at', '-id')
     )
     if user:
         blocked_users = get_blocked_users(user)
         posts_ids = Recommender(user).get_posts_ids()
-        posts = posts.exclude(owner__in=blocked_users).filter(id__in=posts_ids)
+        posts = posts.exclude(owner__in=blocked_users).filter(id__any=posts_ids)
     return posts
 
 
-def get_feed_posts(user_id: int):
-    posts = (
-        Post.objects.annotated().
-        filter(owner__followers__from_user_id=user_id).
-        prefetch_related('tags').
-        order_by('-created_at')
-    )
-    return posts
+def get_feed_posts(user_id: int, ranked: bool = False) -> Timeline:
+    """Home feed, newest first or ranked by engagement."""
+    if ranked:
+        return RankedTimeline(user_id).load()
+    return Timeline(user_id).load()
 
 
 def get_archived_posts(user_id: int):
-    key = 'archived_posts'
-    posts = cache.get(key)
-    if posts is None:
-        subquery = PostMedia.objects.filter(post=models.OuterRef('pk'))
-        posts = (
+    def archived_posts():
+        return (
             Post.objects.
             filter(owner_id=user_id, archived=True).
-            annotate(
-                likes_count=models.Count('likes'),
-                file=Concat(
-                    models.Value('/media/'),
-                    models.Subquery(subquery.values('file')[:1]),
-                    output_field=models.CharField()
-                )
-            ).
+            with_files().
             select_related('owner', 'owner__privacy')
         )
-        cache.set(key, posts, 60 * 60)
-    return posts
+    return get_or_set('archived_posts', user_id, archived_posts)
 
 
 def get_archived_stories(user_id: int):
-    key = 'archived_stories'
-    stories = cache.get(key)
-    if stories is None:
-        stories = Story.objects.filter(owner_id=user_id, archived=True)
-        cache.set(key, stories, 60 * 60)
-    return stories
+    def archived_stories():
+        return Story.objects.filter(owner_id=user_id, archived=True)
+    return get_or_set('archived_stories', user_id, archived_stories)
 
 
 def get_uninteresting_posts(user_id: int):
-    key = 'uninteresting_posts'
-    posts = cache.get(key)
-    if posts is None:
+    def uninteresting_posts():
         un_posts = UninterestingPost.objects.filter(user_id=user_id)
         posts_ids = un_posts.values_list('post_id', flat=True)
-        posts = Post.objects.annotated().filter(id__in=posts_ids)
-        cache.set(key, posts, 60 * 60)
-    return posts
+        return Post.objects.annotated().filter(id__in=posts_ids)
+    return get_or_set('uninteresting_posts', user_id, uninteresting_posts)
 
 
 class SearchEngineAI:
@@ -0,0 +1,63 @@
+from django.db import models
+
+from blogs.models import Post, UninterestingPost
+from users.models import Follower
+
+
+def kind(name: str) -> models.Value:
+    return models.Value(name, output_field=models.CharField())
+
+
+class ViewerState:
+    """
+    What the viewing user did with a page of posts: liked, saved or
+    marked them uninteresting, and which owners they follow.
+
+    Read with a single query for the whole page, whatever its size,
+    instead of one `exists()` per post and relation.
+    """
+
+    def __init__(self, user, posts):
+        self.liked = set()
+        self.saved = set()
+        self.uninteresting = set()
+        self.following = set()
+        if not user.is_authenticated or not posts:
+            return
+
+        ids = [post.id for post in posts]
+        owners = {post.owner_id for post in posts}
+        liked = Post.likes.through.objects.filter(
+            user_id=user.id,
+            post_id__any=ids,
+        ).order_by().values_list(kind('liked'), 'post_id')
+        saved = Post.saved.through.objects.filter(
+            user_id=user.id,
+            post_id__any=ids,
+        ).order_by().values_list(kind('saved'), 'post_id')
+        uninteresting = UninterestingPost.objects.filter(
+            user_id=user.id,
+            post_id__any=ids,
+        ).order_by().values_list(kind('uninteresting'), 'post_id')
+        following = Follower.objects.filter(
+            from_user_id=user.id,
+            to_user_id__any=owners,
+        ).order_by().values_list(kind('following'), 'to_user_id')
+
+        rows = liked.union(saved, uninteresting, following, all=True)
+        for name, object_id in rows:
+            getattr(self, name).add(object_id)
+
+    def apply(self, posts):
+        """Set `is_liked`, `is_saved`, `is_uninteresting` and `follows_owner`."""
+        for post in posts:
+            post.is_liked = post.id in self.liked
+            post.is_saved = post.id in self.saved
+            post.is_uninteresting = post.id in self.uninteresting
+            post.follows_owner = post.owner_id in self.following
+        return posts
+
+
+def with_viewer_state(user, posts):
+    posts = list(posts)
+    return ViewerState(user, posts).apply(posts)
@@ -9,29 +9,31 @@ from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
 from common.utils import create_action, redis_client, get_blocked_users
-from blogs import utils
+from blogs import trending, utils
+from blogs.explore import FilteredExplore, session_seed
 from blogs.filters import PostFilter
 from blogs.models import Comment, Post, PostMedia, UninterestingPost
 from blogs.forms import PostForm
 from blogs.mixins import PostActionMixin, PostsMixin
-from users.models import Follower
+from blogs.viewer import with_viewer_state
 
 
 class ExploreView(PostsMixin):
 
     def get_queryset(self):
         user = self.request.user
-        if user.is_authenticated:
-            queryset = utils.get_explore_posts(user)
-        else:
-            queryset = utils.get_explore_posts()
+        if not user.is_authenticated:
+            user = None
 
         self.filter_queryset = PostFilter(
             self.request.GET,
-            queryset=queryset,
+            queryset=utils.get_explore_posts(user),
             request=self.request,
         )
-        return self.filter_queryset.qs
+        if PostFilter.is_filtering(self.request.GET):
+            return FilteredExplore(self.filter_queryset.qs)
+        seed = session_seed(self.request.session)
+        return utils.get_explore_pool(user, seed)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -42,7 +44,8 @@ class ExploreView(PostsMixin):
 class FeedView(PostsMixin):
 
     def get_queryset(self):
-        return utils.get_feed_posts(self.request.user.id)
+        ranked = self.request.GET.get('order') == 'ranked'
+        return utils.get_feed_posts(self.request.user.id, ranked)
 
 
 class PostView(DetailView):
@@ -72,20 +75,16 @@ class PostView(DetailView):
                 pipeline.sadd(viewed_posts_key, post.id)
                 pipeline.sadd(post_views_key, current_user.username)
                 pipeline.scard(post_views_key)
+                trending.record_post(post, 'view')
             pipeline_response = pipeline.execute()
         context['total_views'] = pipeline_response[-1]
 
         owner_privacy = post.owner.privacy
-        is_follower = Follower.objects.filter(
-            from_user=current_user,
-            to_user=post.owner,
-        ).exists()
+        with_viewer_state(current_user, [post])
+        is_follower = post.follows_owner
 
         context['is_follower'] = is_follower
-        context['is_uninteresting'] = UninterestingPost.objects.filter(
-            user=current_user,
-            post=post,
-        ).exists()
+        context['is_uninteresting'] = post.is_uninteresting
 
         # TODO: Refactor this
         if post.is_comment:
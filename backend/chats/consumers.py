@@ -1,8 +1,9 @@
-import base64
 import json
+import tempfile
 
 from django.db import transaction
-from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError
+from django.core.files import File
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
@@ -11,12 +12,38 @@ from users.models import User
 from chats.models import Message, PrivateChat, GroupChat, MessageImage
 
 
+# Binary frames carry upload chunks: a 4-byte big-endian upload id,
+# then the chunk bytes. Uploads are opened and finished by text frames.
+UPLOAD_HEADER_SIZE = 4
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+# uploads in progress on one connection
+MAX_UPLOADS = 5
+
+
+def is_upload_id(value) -> bool:
+    """Upload ids must fit the header of the binary frames."""
+    return (
+        type(value) is int
+        and 0 <= value < 1 << (8 * UPLOAD_HEADER_SIZE)
+    )
+
+
+def is_media_ids(value) -> bool:
+    """Media attached to a message, as returned by `upload_finish`."""
+    return (
+        isinstance(value, list)
+        and all(type(media_id) is int for media_id in value)
+    )
+
+
 class ChatConsumer(AsyncWebsocketConsumer):
 
     async def connect(self):
         self.user = self.scope['user']
         self.chat = self.scope['url_route']['kwargs']['chat_id']
         self.chat_name = f'chat_{self.chat}'
+        self.uploads = {}
+        self.pending_media = set()
 
         # Join room group
         await self.channel_layer.group_add(self.chat_name, self.channel_name)
@@ -27,21 +54,44 @@ class ChatConsumer(AsyncWebsocketConsumer):
             self.chat_name,
             self.channel_name,
         )
+        for upload in self.uploads.values():
+            upload['file'].close()
+        self.uploads.clear()
+        if self.pending_media:
+            await self.remove_pending_media(self.pending_media)
 
     # Receive message from WebSocket
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            return await self.receive_chunk(bytes_data)
+
         received_data = json.loads(text_data)
 
         chat = received_data.get('chat', None)
         action = received_data.get('action', None)
         url = received_data.get('url', None)
-        user = received_data.get('user', None)
+        # messages are always sent as the connected user
+        user = self.user.username
         message = received_data.get('message', None)
         avatar = received_data.get('avatar', None)
         files = received_data.get('files', None)
 
         match action:
+            case 'upload_start':
+                return await self.start_upload(received_data)
+
+            case 'upload_finish':
+                return await self.finish_upload(received_data)
+
             case 'send_message':
+                if files is not None and not is_media_ids(files):
+                    # errors go to the sender only
+                    error = {'action': 'message_error', 'error': 'Invalid files'}
+                    return await self.send(text_data=json.dumps(error))
+                if url == 'group_chat':
+                    files = await self.save_group_message(chat, message, files)
+                else:
+                    files = await self.save_private_message(chat, message, files)
                 data = {
                     'action': action,
                     'url': url,
@@ -51,10 +101,6 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     'message': message,
                     'files': files,
                 }
-                if url == 'group_chat':
-                    await self.save_group_message(chat, user, message, files)
-                else:
-                    await self.save_private_message(chat, user, message, files)
 
             case 'clear_chat':
                 await self.clear_chat(url, chat)
@@ -65,6 +111,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 data = {'action': action, 'chat': chat}
 
             case 'leave_group':
+                user = received_data.get('user', None)
                 await self.leave_group(chat, user)
                 data = {'action': action, 'chat': chat, 'user': user}
 
@@ -76,43 +123,125 @@ class ChatConsumer(AsyncWebsocketConsumer):
         # Send message to WebSocket
         await self.send(text_data=json.dumps(event))
 
+    async def send_upload_status(self, action, upload_id, **kwargs):
+        # upload replies go to the uploader only
+        data = {'action': action, 'upload': upload_id, **kwargs}
+        await self.send(text_data=json.dumps(data))
+
+    async def start_upload(self, data):
+        upload_id = data.get('upload')
+        if not is_upload_id(upload_id):
+            error = 'Invalid upload id'
+        elif upload_id in self.uploads:
+            error = 'Upload already started'
+        elif len(self.uploads) >= MAX_UPLOADS:
+            error = 'Too many uploads'
+        else:
+            self.uploads[upload_id] = {
+                'file': tempfile.SpooledTemporaryFile(max_size=1024 * 1024),
+                'size': 0,
+            }
+            return
+        await self.send_upload_status('upload_error', upload_id, error=error)
+
+    async def receive_chunk(self, bytes_data):
+        upload_id = int.from_bytes(bytes_data[:UPLOAD_HEADER_SIZE], 'big')
+        upload = self.uploads.get(upload_id)
+        if upload is None:
+            return
+
+        chunk = bytes_data[UPLOAD_HEADER_SIZE:]
+        upload['size'] += len(chunk)
+        if upload['size'] > MAX_UPLOAD_SIZE:
+            upload['file'].close()
+            del self.uploads[upload_id]
+            await self.send_upload_status(
+                'upload_error',
+                upload_id,
+                error='File is too large',
+            )
+            return
+        upload['file'].write(chunk)
+
+    async def finish_upload(self, data):
+        upload_id = data.get('upload')
+        if not is_upload_id(upload_id):
+            return
+        upload = self.uploads.pop(upload_id, None)
+        if upload is None:
+            return
+
+        with upload['file'] as file:
+            file.seek(0)
+            try:
+                media = await self.save_media(file)
+            except ValidationError as exc:
+                await self.send_upload_status(
+                    'upload_error',
+                    upload_id,
+                    error=exc.messages[0],
+                )
+                return
+        self.pending_media.add(media.id)
+        await self.send_upload_status(
+            'upload_finish',
+            upload_id,
+            media=media.id,
+            url=media.file.url,
+        )
+
+    @database_sync_to_async
+    def save_media(self, file):
+        # renamed after its decoded format by `MessageImage.process_image`
+        return MessageImage.objects.create(
+            user=self.user,
+            file=File(file, name='upload'),
+        )
+
+    @database_sync_to_async
+    def remove_pending_media(self, media_ids):
+        MessageImage.objects.filter(id__in=media_ids, message=None).delete()
+
     @database_sync_to_async
-    def save_group_message(self, chat_id, user, message, files):
+    def save_group_message(self, chat_id, message, files):
         chat = GroupChat.objects.get(id=chat_id)
-        sender = User.objects.get(username=user)
-        users = chat.users.exclude(username=sender.username)
+        users = chat.users.exclude(id=self.user.id)
 
-        message_id = self.save_db_message(chat, sender, message, files)
+        message_id, files = self.save_db_message(chat, message, files)
         # Add message to unread list for each user in the room
         for chat_user in users:
             redis_client.sadd(f'user:{chat_user.username}:group_unread', message_id)
+        return files
 
     @database_sync_to_async
-    def save_private_message(self, chat_id, user, message, files):
+    def save_private_message(self, chat_id, message, files):
         chat = PrivateChat.objects.get(id=chat_id)
-        sender = User.objects.get(username=user)
-        users = chat.users.exclude(username=sender.username)
+        users = chat.users.exclude(id=self.user.id)
 
-        message_id = self.save_db_message(chat, sender, message, files)
+        message_id, files = self.save_db_message(chat, message, files)
         redis_client.sadd(f'user:{users[0].username}:private_unread', message_id)
+        return files
 
-    def save_db_message(self, chat, sender, message, files):
+    def save_db_message(self, chat, message, files):
+        """Save a message of the connected user, attaching their media."""
         with transaction.atomic():
             message_obj = Message.objects.create(
-                user=sender,
+                user=self.user,
                 chat=chat,
                 content=message if message else ''
             )
 
+            urls = []
             if files:
-                files_list = []
-                for file, name in files:
-                    decoded_file = base64.b64decode(file.split(';base64,')[1])
-                    content_file = ContentFile(decoded_file, name)
-                    MessageImage(message=message_obj, file=content_file)
-
-                MessageImage.objects.bulk_create(files_list)
-            return message_obj.id
+                media = MessageImage.objects.filter(
+                    id__in=files,
+                    user=self.user,
+                    message=None,
+                )
+                urls = [obj.file.url for obj in media]
+                media.update(message=message_obj)
+                self.pending_media.difference_update(files)
+            return message_obj.id, urls
 
     @database_sync_to_async
     def clear_chat(self, url, chat_id):
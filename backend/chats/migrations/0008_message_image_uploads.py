@@ -0,0 +1,26 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0007_alter_groupchat_image'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messageimage',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='message_images', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='messageimage',
+            name='message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='files', to='chats.message'),
+        ),
+    ]
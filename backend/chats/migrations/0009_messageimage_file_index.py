@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0008_message_image_uploads'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='messageimage',
+            name='file',
+            field=models.FileField(blank=True, db_index=True, upload_to='messages/%Y/%m/%d/'),
+        ),
+    ]
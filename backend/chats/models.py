@@ -1,14 +1,28 @@
+from uuid import uuid4
+from PIL import Image
 from django.db import models
+from django.core.exceptions import ValidationError
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import (
     GenericForeignKey,
     GenericRelation,
 )
 
+from common.images import downscale_upload
 from common.models import BaseModel
 from chats.managers import ChatManager
 
 
+IMAGE_SIZE = (1280, 1280)
+# decoded format -> stored extension, other formats are rejected
+IMAGE_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+
+
 class PrivateChat(models.Model):
     users = models.ManyToManyField('users.User', related_name='private_chats')
     messages = GenericRelation('chats.Message', related_query_name='private_chat')
@@ -55,6 +69,43 @@ class MessageImage(models.Model):
     message = models.ForeignKey(
         to='chats.Message',
         on_delete=models.CASCADE,
-        related_name='files'
+        related_name='files',
+        blank=True,
+        null=True,
+    )
+    # uploader, until the image is attached to a message
+    user = models.ForeignKey(
+        to='users.User',
+        on_delete=models.CASCADE,
+        related_name='message_images',
+        blank=True,
+        null=True,
     )
-    file = models.FileField(upload_to='messages/%Y/%m/%d/', blank=True)
+    file = models.FileField(upload_to='messages/%Y/%m/%d/', blank=True, db_index=True)
+
+    def process_image(self):
+        """
+        Store the upload under a random name with the extension of its
+        decoded format, the name sent by the client is never used.
+        """
+
+        try:
+            with Image.open(self.file) as img:
+                extension = IMAGE_EXTENSIONS.get(img.format)
+        except (OSError, Image.DecompressionBombError):
+            extension = None
+        finally:
+            self.file.seek(0)
+        if extension is None:
+            raise ValidationError('The file is not a supported image')
+
+        content = downscale_upload(self.file, IMAGE_SIZE)
+        if content is not None:
+            self.file.save(f'{uuid4().hex}.jpg', content, save=False)
+        else:
+            self.file.name = f'{uuid4().hex}.{extension}'
+
+    def save(self, *args, **kwargs):
+        if not self.pk and self.file:
+            self.process_image()
+        super().save(*args, **kwargs)
@@ -16,6 +16,18 @@ document.addEventListener('DOMContentLoaded', (event) => {
 	chatSocket.onmessage = function(event) {
 		const data = JSON.parse(event.data);
 		switch (data.action) {
+			case "upload_finish":
+			case "upload_error":
+				const pending = uploads.get(data.upload);
+				if (pending) {
+					uploads.delete(data.upload);
+					if (data.action == "upload_finish") {
+						pending.resolve(data.media);
+					} else {
+						pending.reject(new Error(data.error));
+					}
+				}
+				break;
 			case "clear_chat":
 				chat.innerHTML = `<p class="fw-bold">Send your first message</p>`;
 				temp_count = 0;
@@ -48,7 +60,7 @@ document.addEventListener('DOMContentLoaded', (event) => {
 								${  
 									data.files
 									? data.files.map(file => `
-										<a href="/media/messages/${file[1]}"><img src="/media/messages/${file[1]}" style="width:200px; height:100%"></a>
+										<a href="${file}"><img src="${file}" style="width:200px; height:100%"></a>
 									`).join('') : ''
 								}
 								${data.message}</p>
@@ -73,7 +85,7 @@ document.addEventListener('DOMContentLoaded', (event) => {
 									${
 										data.files
 										? data.files.map(file => `
-											<a href="/media/messages/${file[1]}"><img src="/media/messages/${file[1]}" style="width:200px; height:100%"></a>
+											<a href="${file}"><img src="${file}" style="width:200px; height:100%"></a>
 										`).join('') : ''
 									}
 									${data.message}
@@ -92,61 +104,65 @@ document.addEventListener('DOMContentLoaded', (event) => {
 		console.error('Chat socket closed unexpectedly');
 	};
 
-	function toDataURL(file, callback) {
-		var reader = new FileReader();
-		reader.onload = function () {
-			var dataURL = reader.result;
-			callback(dataURL);
+	// Images are streamed as binary frames: a 4-byte upload id, then a chunk
+	const CHUNK_SIZE = 64 * 1024;
+	const uploads = new Map();
+	let upload_count = 0;
+
+	async function uploadFile(file) {
+		const upload_id = ++upload_count;
+		const finished = new Promise((resolve, reject) => {
+			uploads.set(upload_id, { resolve, reject });
+		});
+
+		chatSocket.send(JSON.stringify({
+			'action': 'upload_start',
+			'upload': upload_id,
+			'name': file.name,
+			'size': file.size,
+		}));
+		for (let offset = 0; offset < file.size; offset += CHUNK_SIZE) {
+			const chunk = await file.slice(offset, offset + CHUNK_SIZE).arrayBuffer();
+			const frame = new Uint8Array(4 + chunk.byteLength);
+			new DataView(frame.buffer).setUint32(0, upload_id);
+			frame.set(new Uint8Array(chunk), 4);
+			chatSocket.send(frame);
 		}
-		reader.readAsDataURL(file);
+		chatSocket.send(JSON.stringify({
+			'action': 'upload_finish',
+			'upload': upload_id,
+		}));
+		return finished;
 	}
 
-	document.querySelector('#message-sent').onclick = function (event) {
+	document.querySelector('#message-sent').onclick = async function (event) {
 		const messageInput = document.querySelector('#message-input');
 		const message = messageInput.value;
-		console.log(user)
 		const files = document.getElementById('customFile');
 		if (message.trim() === "" && files.files.length === 0) {
 			return;
-		} else if (files.files.length === 0) {
-			chatSocket.send(JSON.stringify({
-				'action': 'send_message',
-				'url': url_name,
-				'chat': chat_id,
-				'user': user,
-				'avatar': avatar,
-				'message': message,
-			}))
-			messageInput.value = '';
-		} else {
-			const promises = [];
-			const files_list = [];
-			for (const file of files.files) {
-				const promise = new Promise((resolve) => {
-					toDataURL(file, function (dataURL) {
-						files_list.push([dataURL, file.name]);
-						resolve(); // Resolve the promise once the message is sent
-					});
-				});
-				promises.push(promise);
-			}
+		}
 
-			// Wait for all promises to resolve before clearing input values
-			Promise.all(promises).then(() => {
-				chatSocket.send(JSON.stringify({
-					'action': 'send_message',
-					'url': url_name,
-					'chat': chat_id,
-					'user': user,
-					'avatar': avatar,
-					'message': message,
-					'files': files_list,
-				}));
-				console.log(files_list);
-				messageInput.value = '';
-				files.value = '';
-			});
+		// upload images first, the message only references their ids
+		let media = [];
+		try {
+			media = await Promise.all(Array.from(files.files).map(uploadFile));
+		} catch (error) {
+			console.error(error);
+			return;
 		}
+
+		chatSocket.send(JSON.stringify({
+			'action': 'send_message',
+			'url': url_name,
+			'chat': chat_id,
+			'user': user,
+			'avatar': avatar,
+			'message': message,
+			'files': media,
+		}));
+		messageInput.value = '';
+		files.value = '';
 	};
 
 	function clear_chat(event) {
@@ -1,5 +1,7 @@
+from io import BytesIO
 from asgiref.sync import sync_to_async
 from unittest.mock import patch
+from PIL import Image
 from django.test import TestCase, override_settings, TransactionTestCase
 from django.urls import reverse
 from django.conf import settings
@@ -8,7 +10,7 @@ from channels.testing.websocket import WebsocketCommunicator
 
 from users.models import User
 from chats.consumers import ChatConsumer
-from chats.models import PrivateChat, GroupChat
+from chats.models import PrivateChat, GroupChat, MessageImage
 
 # TODO: Rewrite the tests using pytest
 
@@ -191,6 +193,99 @@ class ConsumerTestCase(TransactionTestCase):
         # Disconnect from the server
         await communicator.disconnect()
 
+    @override_settings(MEDIA_ROOT=settings.BASE_DIR / 'test_media')
+    async def test_send_message_with_image(self):
+        communicator = await self.connect_communicator()
+
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200), 'gray').save(buffer, format='JPEG')
+        image = buffer.getvalue()
+
+        # Stream the image in chunks
+        await communicator.send_json_to({
+            'action': 'upload_start',
+            'upload': 1,
+            'name': '../image.png',
+        })
+        for offset in range(0, len(image), 1024):
+            chunk = image[offset:offset + 1024]
+            await communicator.send_to(bytes_data=(1).to_bytes(4, 'big') + chunk)
+        await communicator.send_json_to({'action': 'upload_finish', 'upload': 1})
+
+        response = await communicator.receive_json_from()
+        self.assertEqual(response['action'], 'upload_finish')
+        media_id = response['media']
+
+        message = {
+            'action': 'send_message',
+            'user': self.user.username,
+            'url': 'chat',
+            'chat': self.chat.id,
+            'avatar': 'staticfiles/users/img/user.png',
+            'message': 'Hello',
+            'files': [media_id],
+        }
+        await communicator.send_json_to(message)
+        response = await communicator.receive_json_from()
+        self.assertEqual(len(response['files']), 1)
+
+        media = await MessageImage.objects.select_related('message').aget(id=media_id)
+        self.assertEqual(media.message.content, 'Hello')
+        self.assertEqual(media.file.size, len(image))
+        # named after the decoded format, not the client name
+        self.assertTrue(media.file.name.endswith('.jpg'))
+        self.assertNotIn('image', media.file.name)
+
+        await communicator.disconnect()
+
+    async def test_reject_message_files(self):
+        communicator = await self.connect_communicator()
+
+        await communicator.send_json_to({
+            'action': 'send_message',
+            'url': 'chat',
+            'chat': self.chat.id,
+            'message': 'Hello',
+            'files': ['a'],
+        })
+        response = await communicator.receive_json_from()
+        self.assertEqual(response['action'], 'message_error')
+
+        msgs = await sync_to_async(lambda: self.chat.messages.count())()
+        self.assertEqual(msgs, 0)
+
+        await communicator.disconnect()
+
+    async def test_reject_upload(self):
+        communicator = await self.connect_communicator()
+
+        await communicator.send_json_to({'action': 'upload_start', 'upload': 'a'})
+        response = await communicator.receive_json_from()
+        self.assertEqual(response['action'], 'upload_error')
+
+        await communicator.send_json_to({'action': 'upload_start', 'upload': 1 << 32})
+        response = await communicator.receive_json_from()
+        self.assertEqual(response['action'], 'upload_error')
+
+        await communicator.send_json_to({'action': 'upload_start', 'upload': 1})
+        await communicator.send_to(bytes_data=(1).to_bytes(4, 'big') + b'not an image')
+        await communicator.send_json_to({'action': 'upload_finish', 'upload': 1})
+        response = await communicator.receive_json_from()
+        self.assertEqual(response['action'], 'upload_error')
+        exists = await MessageImage.objects.filter(user=self.user).aexists()
+        self.assertFalse(exists)
+
+        for upload_id in range(2, 8):
+            await communicator.send_json_to({'action': 'upload_start', 'upload': upload_id})
+        response = await communicator.receive_json_from()
+        self.assertEqual(response, {
+            'action': 'upload_error',
+            'upload': 7,
+            'error': 'Too many uploads',
+        })
+
+        await communicator.disconnect()
+
     async def test_clear_chat(self):
         communicator = await self.connect_communicator()
 
@@ -1 +1,2 @@
-from common.utils import redis_client
\ No newline at end of file
+from common import db  # registers the `__any` lookup
+from common.utils import redis_client
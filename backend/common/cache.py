@@ -0,0 +1,145 @@
+import hashlib
+
+from functools import wraps
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from common.utils import redis_client
+
+
+# short enough for the counters and the content of other users to stay fresh
+RESPONSE_CACHE_TTL = 60 * 5
+DATA_CACHE_TTL = 60 * 60
+
+
+def version_key(scope: str) -> str:
+    return f'cache:version:{scope}'
+
+
+def user_scope(user_id: int) -> str:
+    """What a user sees: their feed, likes, saves and follows."""
+    return f'user:{user_id}'
+
+
+def profile_scope(slug: str) -> str:
+    """What others see of a user: the profile and its posts."""
+    return f'profile:{slug}'
+
+
+def data_scope(name: str, owner_id: int | None = None) -> str:
+    """The `name` data of one user, or of everyone."""
+    if owner_id is None:
+        return f'data:{name}'
+    return f'data:{name}:{owner_id}'
+
+
+def get_versions(scopes: list[str]) -> list[str]:
+    versions = redis_client.mget([version_key(scope) for scope in scopes])
+    return [version or '0' for version in versions]
+
+
+def bump(*scopes: str):
+    """
+    Outdate the cached responses of the scopes, once the current
+    transaction commits. Old entries are never deleted, they are not
+    read anymore and expire.
+    """
+
+    if not scopes:
+        return
+
+    def increment():
+        with redis_client.pipeline(transaction=False) as pipeline:
+            for scope in scopes:
+                pipeline.incr(version_key(scope))
+            pipeline.execute()
+
+    transaction.on_commit(increment)
+
+
+def bump_user(user):
+    bump(user_scope(user.id), profile_scope(user.slug))
+
+
+def response_key(request, scopes: list[str]) -> str:
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    versions = ':'.join(get_versions(scopes))
+    return f'response:{request.user.id}:{path}:{versions}'
+
+
+def cache_response(scopes=None, timeout: int = RESPONSE_CACHE_TTL):
+    """
+    Cache the data of a GET view method for the requesting user,
+    keyed by the path with its query, so each cursor page has its own
+    entry, and by the versions of the scopes the response depends on.
+
+    `scopes(view)` returns the scopes besides the user one,
+    e.g. the profile of a `slug` url.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(view, request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return func(view, request, *args, **kwargs)
+
+            names = [user_scope(request.user.id)]
+            if scopes is not None:
+                names += scopes(view)
+            key = response_key(request, names)
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            response = func(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def data_key(name: str, owner_id: int) -> str:
+    scopes = [data_scope(name), data_scope(name, owner_id)]
+    versions = ':'.join(get_versions(scopes))
+    return f'data:{name}:{owner_id}:{versions}'
+
+
+def get_or_set(name: str, owner_id: int, func, timeout: int = DATA_CACHE_TTL):
+    """
+    The `name` data of a user, computed by `func` on a miss.
+    The key carries the versions of the user data and of the whole
+    `name` data, so `invalidate` never deletes or scans keys.
+    """
+
+    key = data_key(name, owner_id)
+    value = cache.get(key)
+    if value is None:
+        value = func()
+        cache.set(key, value, timeout)
+    return value
+
+
+def invalidate(name: str, *owner_ids: int):
+    """Outdate the `name` data of the users, or of everyone without ids."""
+    if owner_ids:
+        bump(*(data_scope(name, owner_id) for owner_id in owner_ids))
+    else:
+        bump(data_scope(name))
+
+
+def cache_queryset(name: str, timeout: int = 5):
+    """Cache the queryset of a view for the requesting user."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(view, *args, **kwargs):
+            return get_or_set(
+                name,
+                view.request.user.id,
+                lambda: func(view, *args, **kwargs),
+                timeout,
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,191 @@
+import base64
+
+from io import BytesIO
+from math import ceil
+from PIL import Image, ImageOps, UnidentifiedImageError
+from django.core.files.base import ContentFile
+
+
+# name -> bounding box, largest first so each size is resized from the previous
+RENDITIONS = {
+    'full': (2048, 2048),
+    'medium': (1080, 1080),
+    'thumbnail': (350, 225),
+}
+
+# stories are portrait, the thumbnail is shown in the stories tray
+STORY_RENDITIONS = {
+    'full': (1080, 1920),
+    'thumbnail': (270, 480),
+}
+
+# name -> (PIL format, extension, encoder options)
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+
+# largest side of the inline placeholder, about 50 bytes as WebP
+PLACEHOLDER_SIZE = 8
+
+# resize in two steps (integer box reduction, then LANCZOS)
+# when the source is at least this many times larger than the target
+REDUCING_GAP = 3.0
+
+# a draft this much smaller than the box is still accepted, so a 4000x3000
+# photo is decoded at 1/2 scale (2000x1500) for the 2048 box
+DRAFT_TOLERANCE = 0.9
+
+
+def draft_size(size: tuple[int, int], box: tuple[int, int]) -> tuple[int, int]:
+    """
+    Smallest size, keeping the aspect ratio, that still fills `box`
+    in either orientation (EXIF rotation is applied after decoding),
+    within `DRAFT_TOLERANCE`.
+    """
+
+    side = max(box)
+    width, height = size
+    ratio = min(side / max(width, height), 1) * DRAFT_TOLERANCE
+    return ceil(width * ratio), ceil(height * ratio)
+
+
+def open_image(file, box: tuple[int, int] | None = None) -> Image.Image | None:
+    """
+    Decode an uploaded file, None if it is not an image.
+
+    With `box`, JPEGs are decoded at a reduced DCT scale (1/2, 1/4, 1/8)
+    that about fills the box, so a 12 MP photo is never fully
+    decoded only to be shrunk to a thumbnail.
+    """
+
+    try:
+        img = Image.open(file)
+        if box is not None:
+            img.draft('RGB', draft_size(img.size, box))
+        img = ImageOps.exif_transpose(img)
+    except UnidentifiedImageError:
+        return None
+
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+def fit(img: Image.Image, size: tuple[int, int]) -> Image.Image:
+    """Crop to the aspect ratio of `size` and resize, like `ImageOps.fit`."""
+    width, height = img.size
+    ratio = size[0] / size[1]
+    if width / height > ratio:
+        crop = height * ratio
+        box = ((width - crop) / 2, 0, (width + crop) / 2, height)
+    else:
+        crop = width / ratio
+        box = (0, (height - crop) / 2, width, (height + crop) / 2)
+    return img.resize(size, Image.LANCZOS, box=box, reducing_gap=REDUCING_GAP)
+
+
+def shrink(img: Image.Image, box: tuple[int, int]) -> Image.Image:
+    """Downscale to fit in `box`, keeping the aspect ratio."""
+    img = img.copy()
+    img.thumbnail(box, Image.LANCZOS, reducing_gap=REDUCING_GAP)
+    return img
+
+
+def make_renditions(
+    img: Image.Image,
+    sizes: dict[str, tuple[int, int]] = RENDITIONS,
+) -> dict[str, Image.Image]:
+    """
+    Downscale an image to every rendition size.
+    Thumbnails are cropped to fill their box, larger sizes keep
+    the aspect ratio and are never upscaled.
+    """
+
+    renditions = {}
+    for name, size in sizes.items():
+        if name == 'thumbnail':
+            img = fit(img, size)
+        else:
+            img = shrink(img, size)
+        renditions[name] = img
+    return renditions
+
+
+def encode_image(img: Image.Image, fmt: str) -> ContentFile:
+    pil_format, _, options = FORMATS[fmt]
+    buffer = BytesIO()
+    img.save(buffer, format=pil_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def make_placeholder(img: Image.Image) -> str:
+    """A blurry few-pixel preview, as a data URI to inline in payloads."""
+    img = shrink(img, (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    buffer = BytesIO()
+    img.save(buffer, format='WEBP', quality=30)
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/webp;base64,{encoded}'
+
+
+def rendition_name(name: str, stem: str, fmt: str) -> str:
+    return f'renditions/{name}/{stem}.{FORMATS[fmt][1]}'
+
+
+def save_once(storage, name: str, content) -> str:
+    """
+    Save a file named after its content. A file with the same name
+    has the same content, so it is kept instead of being renamed.
+    """
+
+    if storage.exists(name):
+        return name
+    saved = storage.save(name, content)
+    if saved != name:
+        # stored at the same time by an identical upload
+        storage.delete(saved)
+    return name
+
+
+def store_renditions(renditions: dict[str, Image.Image], storage, path) -> dict:
+    """
+    Encode every rendition in every format and save it to storage.
+    `path(name, fmt)` gives the storage name of a rendition, unique
+    to the content of the upload.
+    """
+
+    return {
+        name: {
+            fmt: save_once(storage, path(name, fmt), encode_image(rendition, fmt))
+            for fmt in FORMATS
+        }
+        for name, rendition in renditions.items()
+    }
+
+
+def rendition_paths(name: str, renditions: dict) -> set[str]:
+    """Storage paths of a file and all of its renditions."""
+    paths = {name}
+    for formats in renditions.values():
+        paths.update(formats.values())
+    return paths
+
+
+def downscale_upload(file, box: tuple[int, int]) -> ContentFile | None:
+    """
+    Re-encode an uploaded image no larger than `box`.
+    None if the file is not an image or already fits.
+    """
+
+    try:
+        with Image.open(file) as img:
+            width, height = img.size
+    except UnidentifiedImageError:
+        return None
+    finally:
+        file.seek(0)
+
+    if width <= box[0] and height <= box[1]:
+        return None
+    img = open_image(file, box)
+    return encode_image(shrink(img, box), 'jpeg')
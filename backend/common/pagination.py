@@ -0,0 +1,131 @@
+import base64
+import binascii
+import json
+import redis
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# newest first, the id breaks ties between posts created at the same time
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+
+def encode_cursor(position: list) -> str:
+    data = json.dumps(position, default=lambda value: value.isoformat())
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int | None = None) -> list:
+    """Values of the ordering fields of the last seen object."""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(position, list) or size not in (None, len(position)):
+        raise ValueError('Invalid cursor')
+    return position
+
+
+def keyset_filter(ordering: tuple[str, ...], position: list) -> Q:
+    """
+    Rows that come after `position` in `ordering`, i.e. for (-a, -b):
+    a < x OR (a = x AND b < y).
+    """
+
+    after = Q()
+    equal = Q()
+    for field, value in zip(ordering, position):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        after |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return after
+
+
+def paginate_keyset(
+    queryset,
+    cursor: str | None,
+    page_size: int,
+    ordering: tuple[str, ...] = DEFAULT_ORDERING,
+) -> tuple[list, str | None]:
+    """
+    Page after `cursor`, and the cursor of the next page (None on the last one).
+
+    Each page is a range scan on the ordering, so deep pages cost the same
+    as the first one and the total count is never needed.
+    Objects with a `seek(position, limit)` method, like redis timelines,
+    paginate themselves on their own ordering.
+    """
+
+    if hasattr(queryset, 'seek'):
+        position = decode_cursor(cursor) if cursor else None
+        try:
+            objects, position = queryset.seek(position, page_size)
+        except (TypeError, ValueError, redis.RedisError):
+            raise ValueError('Invalid cursor')
+        return objects, position and encode_cursor(position)
+
+    if cursor:
+        position = decode_cursor(cursor, len(ordering))
+        queryset = queryset.filter(keyset_filter(ordering, position))
+    objects = list(queryset.order_by(*ordering)[:page_size + 1])
+    if len(objects) <= page_size:
+        return objects, None
+
+    objects = objects[:page_size]
+    last = objects[-1]
+    position = [getattr(last, field.lstrip('-')) for field in ordering]
+    return objects, encode_cursor(position)
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over `(created_at, id)`, without offsets or counts."""
+
+    page_size = 20
+    cursor_query_param = 'cursor'
+    ordering = DEFAULT_ORDERING
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        ordering = getattr(view, 'keyset_ordering', self.ordering)
+        try:
+            page, self.next_cursor = paginate_keyset(
+                queryset,
+                cursor,
+                self.page_size,
+                ordering,
+            )
+        except ValueError as exc:
+            raise NotFound(str(exc))
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
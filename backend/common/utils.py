@@ -2,7 +2,6 @@ import redis
 
 from datetime import timedelta
 from django.utils import timezone
-from django.core.cache import cache
 from django.contrib.contenttypes.models import ContentType
 
 from users.models import Action
@@ -47,29 +46,15 @@ def create_action(owner, act, target, file=None):
 
 
 def get_blocked_users(user):
-    key1 = 'blocked_from'
-    key2 = 'blocked_by'
-    blocked = cache.get(key1)
-    blocked_by = cache.get(key2)
-    if blocked is None:
+    """Ids of the users blocked by the user or blocking them."""
+    from common.cache import get_or_set  # imports `redis_client` from here
+
+    def blocked_users():
         blocked = user.blocked.values_list('to_user', flat=True)
-        cache.set(key1, blocked, 60 * 60)
-    if blocked_by is None:
         blocked_by = user.blocked_by.values_list('from_user', flat=True)
-        cache.set(key2, blocked_by, 60 * 60)
-    return list(blocked) + list(blocked_by)
-
-
-def cache_queryset(name, timeout=5):
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            objs = cache.get(name)
-            if objs is None:
-                objs = func(*args, **kwargs)
-                cache.set(name, objs, timeout)
-            return objs
-        return wrapper
-    return decorator
+        return list(blocked) + list(blocked_by)
+
+    return get_or_set('blocked_users', user.id, blocked_users)
 
 
 def get_user_ip(request):
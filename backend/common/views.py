@@ -0,0 +1,119 @@
+import posixpath
+import re
+
+from django.conf import settings
+from django.db import models
+from django.http import Http404, HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+from blogs.models import PostMedia, Story
+from chats.models import MessageImage
+from users.models import Follower, User
+
+
+# files named after the sha256 of their content never change
+HASHED_PATH = re.compile(r'(^|/)[0-9a-f]{64}\.\w+$')
+# story renditions are named after a random stem
+STORY_RENDITION_PATH = re.compile(r'^stories/\w+/([0-9a-f]{32})\.\w+$')
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MUTABLE_MAX_AGE = 60 * 60
+
+
+def owner_media_access(user: User, owner_ids: set[int]) -> str | None:
+    """Media of public accounts, own media and media of followed accounts."""
+    if not owner_ids:
+        # files that are not referenced anymore are not served
+        return None
+    owners = User.objects.filter(id__in=owner_ids)
+    if owners.filter(privacy__private_account=False).exists():
+        return 'public'
+    if not user.is_authenticated:
+        return None
+    if user.id in owner_ids or Follower.objects.filter(
+        from_user=user,
+        to_user_id__in=owner_ids,
+    ).exists():
+        return 'private'
+    return None
+
+
+def post_media_owners(path: str) -> set[int]:
+    if HASHED_PATH.search(path):
+        # renditions are named after the digest of their blob
+        stem = path.rsplit('/', 1)[-1].split('.')[0]
+        media = PostMedia.objects.filter(blob__digest=stem)
+    else:
+        # originals waiting to be processed
+        media = PostMedia.objects.filter(file=path)
+    return set(media.values_list('post__owner_id', flat=True))
+
+
+def story_owners(path: str) -> set[int]:
+    match = STORY_RENDITION_PATH.match(path)
+    if match is not None:
+        stories = Story.objects.filter(stem=match[1])
+    else:
+        stories = Story.objects.filter(img=path)
+    return set(stories.values_list('owner_id', flat=True))
+
+
+def message_image_access(user: User, path: str) -> str | None:
+    if not user.is_authenticated:
+        return None
+    media = MessageImage.objects.filter(file=path).filter(
+        models.Q(user=user) |
+        models.Q(message__private_chat__users=user) |
+        models.Q(message__group_chat__users=user)
+    )
+    return 'private' if media.exists() else None
+
+
+def get_media_access(user: User, path: str) -> str | None:
+    """
+    'public' if anyone may see the file, 'private' if only some users
+    may, None if access is denied.
+    """
+
+    match path.split('/', 1)[0]:
+        case 'posts' | 'renditions':
+            return owner_media_access(user, post_media_owners(path))
+        case 'stories':
+            return owner_media_access(user, story_owners(path))
+        case 'messages':
+            return message_image_access(user, path)
+        case _:
+            # avatars and group images
+            return 'public'
+
+
+def serve_media(request, path):
+    """
+    Check access to a media file and let nginx send it.
+    The response only carries an `X-Accel-Redirect` header to the
+    internal nginx location, in DEBUG the file is served by django.
+    """
+
+    if posixpath.normpath(path) != path or path.startswith(('/', '..')):
+        raise Http404('File not found')
+
+    access = get_media_access(request.user, path)
+    if access is None:
+        raise Http404('File not found')
+
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse()
+        response['X-Accel-Redirect'] = f'{settings.MEDIA_ACCEL_PREFIX}{path}'
+        # let nginx detect the type of the file
+        del response['Content-Type']
+    else:
+        response = serve(request, path, document_root=settings.MEDIA_ROOT)
+
+    if HASHED_PATH.search(path):
+        cache_control = {'max_age': IMMUTABLE_MAX_AGE, 'immutable': True}
+    else:
+        cache_control = {'max_age': MUTABLE_MAX_AGE}
+    # private files must not be stored by shared caches
+    cache_control[access] = True
+    patch_cache_control(response, **cache_control)
+    return response
@@ -11,4 +11,23 @@ app.conf.broker_url = settings.CELERY_BROKER
 app.conf.beat_scheduler = settings.CELERY_BEAT_SCHEDULER
 app.conf.broker_connection_retry_on_startup = True
 app.conf.result_backend = settings.CELERY_BROKER
+app.conf.beat_schedule = {
+    'refresh-explore-pool': {
+        'task': 'blogs.tasks.refresh_explore_pool',
+        'schedule': 60 * 15,  # blogs.explore.POOL_REFRESH
+    },
+    'refresh-vip-pool': {
+        'task': 'blogs.tasks.refresh_vip_pool',
+        'schedule': 60,
+    },
+    'refresh-trending': {
+        'task': 'blogs.tasks.refresh_trending',
+        'schedule': 60 * 5,  # blogs.trending.TRENDING_REFRESH
+    },
+    'rank-active-feeds': {
+        'task': 'blogs.tasks.rank_active_feeds',
+        # well within blogs.ranking.RANKED_FEED_TTL
+        'schedule': 60 * 15,
+    },
+}
 app.autodiscover_tasks()
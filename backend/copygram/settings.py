@@ -86,6 +86,10 @@ else:
     MEDIA_URL = 'media/'
     MEDIA_ROOT = BASE_DIR / 'media'
 
+# Media files are sent by nginx from this internal location
+MEDIA_ACCEL_REDIRECT = not DEBUG
+MEDIA_ACCEL_PREFIX = '/protected/'
+
 
 SECRET_KEY = os.getenv('SECRET_KEY')
 
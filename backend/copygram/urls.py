@@ -16,8 +16,7 @@ Including another URLconf
 """
 from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
-from django.conf.urls.static import static
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from two_factor.urls import urlpatterns as tf_urls
@@ -25,6 +24,7 @@ from two_factor.urls import urlpatterns as tf_urls
 from users.api import views as users_api
 from blogs.api import views as blogs_api
 from chats.api import views as chats_api
+from common.views import serve_media
 
 
 r = DefaultRouter()
@@ -66,8 +66,12 @@ urlpatterns = [
 ]
 
 
-if settings.DEBUG:
-    urlpatterns += static(
-        prefix=settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
+# local media: access is checked by django, files are sent by nginx
+if settings.MEDIA_URL and '://' not in settings.MEDIA_URL:
+    urlpatterns += [
+        re_path(
+            route=rf'^{settings.MEDIA_URL.strip("/")}/(?P<path>.+)$',
+            view=serve_media,
+            name='media',
+        ),
+    ]
@@ -1,7 +1,5 @@
 from django.conf import settings
 from django.db.models import Q
-from django.core.cache import cache
-from django.utils.decorators import method_decorator
 from django.core.mail import send_mail
 from django_filters.rest_framework import DjangoFilterBackend
 from django_celery_beat.models import PeriodicTask
@@ -12,11 +10,11 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 
-from common.utils import cache_queryset, redis_client
+from common.cache import cache_queryset, cache_response, get_or_set, profile_scope
+from common.utils import redis_client
 from common.viewsets import CustomModelViewSet, ListModelViewSet
 from users.api import serializers
 from users.api.mixins import FollowerRequestMixin
-from users.tasks import cancel_vip_scheduler
 from users.permissions import IsOwner
 from users.models import User, Action, Referral
 from users.utils import (
@@ -31,7 +29,10 @@ from users.utils import (
     process_follower_request,
 )
 from users.recommendations import Recommender
+from users.vip import activate_vip, is_vip
 from blogs.models import Post, Story
+from blogs.tasks import refresh_vip_pool
+from blogs.viewer import with_viewer_state
 from blogs.api.serializers import (
     PostSerializer,
     StorySerializer,
@@ -39,6 +40,10 @@ from blogs.api.serializers import (
 )
 
 
+def profile_scopes(view) -> list[str]:
+    return [profile_scope(view.kwargs['slug'])]
+
+
 ##############################################
 # USER
 class UserViewSet(CustomModelViewSet):
@@ -98,16 +103,18 @@ class UserViewSet(CustomModelViewSet):
         )
         return self.get_paginated_response(serializer.data)
 
+    @cache_response(profile_scopes)
     def retrieve(self, request, *args, **kwargs):
         user = self.get_object()
         serializer = self.get_serializer(user)
         return Response(serializer.data)
 
     @action(detail=True)
+    @cache_response(profile_scopes)
     def posts(self, request, slug=None):
-        post = get_user_posts(user_id=self.get_object().id)
+        posts = get_user_posts(user_id=self.get_object().id)
         serializer = PostSerializer(
-            instance=post,
+            instance=with_viewer_state(request.user, posts),
             many=True,
             context={'request': request},
         )
@@ -341,26 +348,28 @@ class ActivityViewSet(ViewSet):
 
     def list(self, request):
         user = self.request.user
-        key = 'my_posts'
-        posts = cache.get(key)
-        if posts is None:
-            posts = Post.objects.annotated().filter(likes=user)
-            cache.set(key, posts, 60 * 10)
+        posts = get_or_set(
+            'my_posts',
+            user.id,
+            lambda: Post.objects.annotated().filter(likes=user),
+            60 * 10,
+        )
 
         serializer = PostSerializer(
-            instance=posts,
+            instance=with_viewer_state(user, posts),
             many=True,
             context={'request': request},
         )
 
-        key = 'my_comments'
-        comments = cache.get(key)
-        if comments is None:
-            comments = (
+        comments = get_or_set(
+            'my_comments',
+            user.id,
+            lambda: (
                 user.comments.exclude(post__archived=True).
                 select_related('post', 'owner')
-            )
-            cache.set(key, comments, 60 * 10)
+            ),
+            60 * 10,
+        )
 
         comments_serializer = CommentSerializer(
             instance=comments,
@@ -393,18 +402,23 @@ class SavedPostsViewSet(ListModelViewSet):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
 
-    @method_decorator(cache_queryset('saved_posts'))
     def get_queryset(self):
         user = self.request.user
         posts = Post.objects.annotated().filter(saved=user)
         return posts
 
+    @cache_response()
+    def list(self, request, *args, **kwargs):
+        posts = with_viewer_state(request.user, self.get_queryset())
+        serializer = self.get_serializer(posts, many=True)
+        return Response(serializer.data)
+
 
 class BlockedUsersViewSet(ListModelViewSet):
     serializer_class = serializers.UserSerializer
     permission_classes = [IsAuthenticated]
 
-    @method_decorator(cache_queryset('blocked'))
+    @cache_queryset('blocked')
     def get_queryset(self):
         user = self.request.user
         blocked = User.objects.blocked(user=user)
@@ -418,7 +432,7 @@ class RecommendationViewSet(ListModelViewSet):
     def get_queryset(self):
         recommendations = Recommender(self.request.user).get_follows_ids()
         users = User.objects.filter(
-            id__in=recommendations,
+            id__any=recommendations,
         ).select_related('privacy')
         return users
 
@@ -454,9 +468,7 @@ class VipAPIView(APIView):
         serializer = serializers.VipSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        vip_users_key = 'active_vip_users'
-        is_activated = redis_client.sismember(vip_users_key, user.username)
-        if is_activated:
+        if is_vip(user.id):
             return Response({'status': 'Wait until the current vip status ends'})
 
         # add the user to vip users
@@ -467,14 +479,10 @@ class VipAPIView(APIView):
 
         remaining_duration = vip_duration - duration
         remaining_duration_key = f'user:{user.username}:vip'
-        with redis_client.pipeline(transaction=True) as pipe:
-            pipe.set(remaining_duration_key, remaining_duration)
-            pipe.sadd(vip_users_key, user.username)
-            pipe.execute()
-
-        # schedule the task
-        # remove the user from VIP users after the end of the VIP status
-        cancel_vip_scheduler.delay(user.username, duration)
+        redis_client.set(remaining_duration_key, remaining_duration)
+        # the status ends by itself, its expiry time is the score
+        activate_vip(user.id, duration)
+        refresh_vip_pool.delay()
 
         return Response({'status': "Well done, you've activated vip status"})
 
@@ -318,12 +318,14 @@ class Recommender:
         uninteresting_posts = list(
             Post.objects.annotated().
             filter(id__in=uninteresting_posts).
-            values('description', 'file')
+            with_phash().
+            values('id', 'description', 'file', 'phash')
         )
         posts = list(
             Post.objects.annotated().
-            filter(id__in=recs).
-            values('id', 'description', 'file')
+            filter(id__any=recs).
+            with_phash().
+            values('id', 'description', 'file', 'phash')
         )
 
         if len(uninteresting_posts) and len(posts):
@@ -368,7 +370,7 @@ class Recommender:
                 additional = (
                     User.objects.
                     exclude(
-                        Q(id__in=recs_with_user) |
+                        Q(id__any=recs_with_user) |
                         Q(followers__from_user=curr_user)
                     ).
                     order_by('?').
@@ -389,7 +391,8 @@ class Recommender:
                         Q(owner_id__in=following)
                     ).
                     order_by('?').
-                    values('id', 'description', 'file')
+                    with_phash().
+                    values('id', 'description', 'file', 'phash')
                 )
 
                 # Get viewed posts
@@ -397,8 +400,9 @@ class Recommender:
                 viewed_posts = redis_client.smembers(viewed_posts_key)
                 viewed_posts_qs = list(
                     Post.objects.annotated().
-                    filter(id__in=set(map(int, viewed_posts))).
-                    values('description', 'file')
+                    filter(id__any=viewed_posts).
+                    with_phash().
+                    values('id', 'description', 'file', 'phash')
                 )
                 # Receive similar posts to the viewed ones
                 if len(additional) and len(viewed_posts_qs):
@@ -2,8 +2,9 @@ from django.utils import timezone
 from django.dispatch import receiver
 from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.signals import user_logged_in, user_logged_out
-from django.core.cache import cache
 
+from blogs import timelines
+from common.cache import bump, bump_user, invalidate, user_scope
 from common.utils import create_action
 from users import models
 from users.tasks import delete_account_scheduler
@@ -43,11 +44,23 @@ def create_user_privacy(instance, created, **kwargs):
     if created:
         models.UserPrivacy.objects.create(user_id=instance.id)
         delete_account_scheduler(instance.id)
+    else:
+        bump_user(instance)
+
+
+@receiver(post_save, sender=models.UserPrivacy)
+def update_user_privacy(instance, **kwargs):
+    bump_user(instance.user)
 
 
 @receiver([post_save, post_delete], sender=models.Block)
-def cache_blocked(**kwargs):
-    cache.delete_many(['blocked', 'blocked_by', 'blocked_from'])
+def cache_blocked(instance, **kwargs):
+    users = (instance.from_user_id, instance.to_user_id)
+    invalidate('blocked_users', *users)
+    invalidate('stories', *users)
+    invalidate('blocked', instance.from_user_id)
+    # the version of the viewer is part of every cached response key
+    bump(*map(user_scope, users))
 
 
 @receiver([post_save], sender=models.Follower)
@@ -55,8 +68,14 @@ def post_follow(instance, created, **kwargs):
     if created:
         create_action(instance.from_user, 'followed you', instance.to_user)
         recommend_users(instance.from_user)
+        timelines.invalidate(instance.from_user_id)
+        bump_user(instance.from_user)
+        bump_user(instance.to_user)
 
 
 @receiver(post_delete, sender=models.Follower)
 def post_unfollow(instance, **kwargs):
     recommend_users(instance.from_user)
+    timelines.invalidate(instance.from_user_id)
+    bump_user(instance.from_user)
+    bump_user(instance.to_user)
@@ -9,28 +9,6 @@ from users.recommendations import Recommender
 from users.models import User
 
 
-@shared_task
-def cancel_vip(username: str):
-    redis_client.srem('active_vip_users', username)
-
-
-def cancel_vip_scheduler(username: str, duration: int):
-    date = datetime.now() + timedelta(minutes=duration)
-    crontab, _ = CrontabSchedule.objects.get_or_create(
-        minute=date.minute,
-        hour=date.hour,
-        day_of_month=date.day,
-        month_of_year=date.month,
-    )
-    PeriodicTask.objects.create(
-        crontab=crontab,
-        name=f'cancel-vip-{username}-',
-        task='users.tasks.cancel_vip',
-        args=json.dumps([username]),
-        one_off=True,
-    )
-
-
 @shared_task
 def delete_account(user_id: int):
     user = User.objects.get(id=user_id)
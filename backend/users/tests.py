@@ -3,7 +3,8 @@ from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.conf import settings
 
-from common.utils import create_action
+from common.cache import data_scope, user_scope, version_key
+from common.utils import create_action, get_blocked_users, redis_client
 from users.models import Block, Follower, User, Action
 from users.utils import generate_reset_password_params
 from blogs.models import Post
@@ -69,6 +70,26 @@ class UserTestCase(TestCase):
         response = self.client.get(reverse('users:profile', args=[slug]))
         self.assertEqual(response.status_code, 200)
 
+    def test_posts_viewer_state(self):
+        User.objects.filter(id=self.user.id).update(is_active=True)
+        # the test users get the same ids on every run
+        redis_client.incr(version_key(user_scope(self.user.id)))
+        redis_client.incr(version_key(data_scope('my_posts', self.user.id)))
+        post = Post.objects.create(description='Test', owner=self.another_user)
+        post.saved.add(self.user)
+        post.likes.add(self.user)
+
+        responses = [
+            self.client.get(reverse('user-posts', args=[self.another_user.slug])).data,
+            self.client.get(reverse('saved-post-list')).data,
+            self.client.get(reverse('activity-list')).data['liked_posts'],
+        ]
+        for data in responses:
+            self.assertEqual(len(data), 1)
+            self.assertTrue(data[0]['is_saved'])
+            self.assertTrue(data[0]['is_liked'])
+            self.assertFalse(data[0]['follows_owner'])
+
     def test_edit_user(self):
         data = {
             'username': 'admin',
@@ -343,6 +364,21 @@ class BlockTestCase(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertEqual(Block.objects.count(), 1)
 
+    def test_cached_blocked_users(self):
+        # the test users get the same ids on every run
+        redis_client.incr(version_key(data_scope('blocked_users')))
+
+        self.assertEqual(get_blocked_users(self.user), [self.fake_user.id])
+        self.assertEqual(get_blocked_users(self.another_user), [])
+        self.assertEqual(get_blocked_users(self.fake_user), [self.user.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Block.objects.create(from_user=self.another_user, to_user=self.fake_user)
+        self.assertEqual(get_blocked_users(self.another_user), [self.fake_user.id])
+        # the entries of other users are kept
+        with self.assertNumQueries(0):
+            self.assertEqual(get_blocked_users(self.user), [self.fake_user.id])
+
     def test_get_blocked_user(self):
         url = reverse('users:profile', args=[self.fake_user.slug])
         response = self.client.get(url)
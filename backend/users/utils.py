@@ -120,9 +120,9 @@ def block_user(from_user: User, to_user: User) -> str:
             user_posts = to_user.likes.filter(owner=from_user)
 
             for post in posts:
-                post.likes.remove(from_user)
+                post.unlike(from_user)
             for post in user_posts:
-                post.likes.remove(to_user)
+                post.unlike(to_user)
 
             Comment.objects.filter(
                 Q(owner=to_user, post__owner=from_user) |
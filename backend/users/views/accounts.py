@@ -48,7 +48,7 @@ class ProfileView(DetailView):
 
         # recommendations for user
         recommendations = Recommender(user).get_follows_ids()
-        context['recommendations'] = User.objects.filter(id__in=recommendations)
+        context['recommendations'] = User.objects.filter(id__any=recommendations)
         return context
 
 
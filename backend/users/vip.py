@@ -0,0 +1,26 @@
+import time
+
+from common.utils import redis_client
+
+
+# user id -> unix time at which the VIP status ends
+VIP_USERS_KEY = 'vip:users'
+
+
+def activate_vip(user_id: int, minutes: int):
+    redis_client.zadd(VIP_USERS_KEY, {user_id: time.time() + minutes * 60})
+
+
+def is_vip(user_id: int) -> bool:
+    expires_at = redis_client.zscore(VIP_USERS_KEY, user_id)
+    return expires_at is not None and expires_at > time.time()
+
+
+def get_vip_user_ids() -> set[int]:
+    """Users whose VIP status has not ended, expired ones are never read."""
+    ids = redis_client.zrangebyscore(VIP_USERS_KEY, f'({time.time()}', '+inf')
+    return set(map(int, ids))
+
+
+def remove_expired_vips() -> int:
+    return redis_client.zremrangebyscore(VIP_USERS_KEY, '-inf', time.time())